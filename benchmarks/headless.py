@@ -0,0 +1,182 @@
+"""Tk for benchmarks: a real (e.g. Xvfb) display when there is one, otherwise
+mocked widgets around a display-less Tcl interpreter.
+
+The mock keeps a Tcl interpreter for the app's variables, runs ``after``
+callbacks itself and replaces the widgets. Its Treeview keeps the items in
+memory and counts the calls made to it, which stands in for the cost of
+redrawing.
+"""
+import itertools
+import time
+import tkinter as tk
+from collections import deque
+from tkinter import ttk
+
+
+def display_available() -> bool:
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return False
+    root.destroy()
+    return True
+
+
+class MockWidget:
+    """Accepts any widget method and ignores it"""
+
+    def __init__(self, *args, **kwargs):
+        self.options = dict(kwargs)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def __setitem__(self, key, value):
+        self.options[key] = value
+
+    def __getitem__(self, key):
+        return self.options.get(key)
+
+
+class MockTreeview(MockWidget):
+    """Treeview items kept in memory; ``calls`` counts the item operations"""
+
+    _ids = itertools.count()
+    row_height = 20
+
+    def __init__(self, parent=None, columns=(), height=20, **kwargs):
+        super().__init__(**kwargs)
+        self.columns = tuple(columns)
+        self.height = height
+        self.items = {}
+        self.order = []
+        self.selected = ()
+        self.calls = 0
+
+    def insert(self, parent, index, values=(), tags=(), **kwargs):
+        self.calls += 1
+        item = f"I{next(self._ids)}"
+        self.items[item] = {"values": tuple(values), "tags": tuple(tags)}
+        self.order.append(item)
+        return item
+
+    def delete(self, *items):
+        self.calls += 1
+        for item in items:
+            self.order.remove(item)
+            del self.items[item]
+
+    def item(self, item, **options):
+        self.calls += 1
+        if options:
+            self.items[item].update({key: tuple(value) for key, value in options.items()})
+        return self.items[item]
+
+    def set(self, item, column, value):
+        self.calls += 1
+        values = list(self.items[item]["values"])
+        values[self.columns.index(column)] = value
+        self.items[item]["values"] = tuple(values)
+
+    def move(self, item, parent, index):
+        self.calls += 1
+        self.order.remove(item)
+        self.order.insert(index, item)
+
+    def get_children(self, item=""):
+        return tuple(self.order)
+
+    def selection_set(self, items):
+        self.selected = tuple(items) if isinstance(items, (list, tuple)) else (items,)
+
+    def selection(self):
+        return self.selected
+
+    def bbox(self, item, column=None):
+        return (0, self.row_height, 100, self.row_height)
+
+    def winfo_height(self):
+        return self.row_height * (self.height + 1)
+
+    def identify_row(self, y):
+        index = y // self.row_height - 1
+        return self.order[index] if 0 <= index < len(self.order) else ""
+
+
+class MockRoot(tk.Tk):
+    """A Tcl interpreter without a display, standing in for the app's root window.
+
+    Window methods are no-ops. Callbacks scheduled with ``after`` (also from
+    worker threads, as the app does) are queued in Python and run by
+    ``update`` once due, or by ``mainloop`` until ``quit``.
+    """
+
+    def __init__(self):
+        super().__init__(useTk=False)
+        # Variables created without a master attach to the default root
+        tk._default_root = self
+        self._callbacks = deque()
+        self._cancelled = set()
+        self._after_ids = itertools.count()
+        self._quit = False
+
+    def _noop(self, *args, **kwargs):
+        return ""
+
+    title = iconbitmap = geometry = resizable = state = attributes = protocol = _noop
+    configure = config = wait_window = withdraw = update_idletasks = _noop
+
+    def after(self, ms, func=None, *args):
+        after_id = f"after#{next(self._after_ids)}"
+        self._callbacks.append((time.monotonic() + ms / 1000, after_id, func, args))
+        return after_id
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+    def after_cancel(self, after_id):
+        self._cancelled.add(after_id)
+
+    def update(self):
+        """Run the callbacks that are due"""
+        now = time.monotonic()
+        for _ in range(len(self._callbacks)):
+            callback = self._callbacks.popleft()
+            due, after_id, func, args = callback
+            if after_id in self._cancelled:
+                self._cancelled.discard(after_id)
+            elif due > now:
+                self._callbacks.append(callback)
+            elif func is not None:
+                func(*args)
+
+    def mainloop(self, n=0):
+        self._quit = False
+        while not self._quit:
+            self.update()
+            time.sleep(0.001)
+
+    def quit(self):
+        self._quit = True
+
+    def destroy(self):
+        # Without Tk there is no "destroy" command, nor windows to destroy
+        if tk._default_root is self:
+            tk._default_root = None
+
+
+def install_mock_display():
+    """Replace the tkinter widgets with mocks; call before importing the app"""
+    for name in ("Frame", "Label", "Entry", "Button", "Toplevel", "Text", "Listbox", "Canvas", "Menu"):
+        setattr(tk, name, MockWidget)
+    for name in ("Frame", "Label", "Entry", "Button", "Combobox", "Progressbar", "Scrollbar", "Style"):
+        setattr(ttk, name, MockWidget)
+    ttk.Treeview = MockTreeview
+
+
+def make_root(mock: bool) -> tk.Tk:
+    if mock:
+        return MockRoot()
+    root = tk.Tk()
+    root.withdraw()
+    return root
@@ -0,0 +1,243 @@
+"""Benchmarks of loading, saving, filtering, searching and displaying a ledger.
+
+    python -m benchmarks.run --sizes 1000,100000
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+
+Each size gets a synthetic ledger (see synthetic.py) in a scratch data
+folder, so the app's own data is never touched. The display benchmarks run
+the app's window: on a real display when there is one (e.g. under
+``xvfb-run``), otherwise with mocked widgets (see headless.py), where the
+number of Treeview calls is reported along with the time.
+
+Results are written as JSON, with the Python, NumPy and git versions, to
+compare runs of different versions of the app.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from benchmarks.headless import display_available, install_mock_display, make_root
+
+# The app's modules (core, utils and benchmarks.synthetic) are imported by main(),
+# once PAS_DATA_DIR points at the scratch data folder
+BASE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BASE_DIR / "benchmarks" / "results"
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+SEARCH_TERM = "groceries 1"
+
+
+class Timings:
+    """Timings of the operations benchmarked on one ledger size"""
+
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: Dict[str, Dict] = {}
+
+    def measure(self, name: str, operation: Callable, setup: Optional[Callable] = None,
+                repeat: Optional[int] = None, counter: Optional[Callable[[], int]] = None):
+        """Time ``operation`` (after an untimed ``setup``) and return its last result.
+        ``counter`` reads a running count, e.g. of Treeview calls, reported per run.
+        """
+        runs = []
+        count = None
+        result = None
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            before = counter() if counter else 0
+            start = time.perf_counter()
+            result = operation()
+            runs.append(time.perf_counter() - start)
+            if counter:
+                count = counter() - before
+        self.results[name] = {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+        if count is not None:
+            self.results[name]["calls"] = count
+        print(f"  {name:<28} {statistics.median(runs) * 1000:10.2f} ms", flush=True)
+        return result
+
+
+def clear_data(data_dir: Path):
+    for path in data_dir.iterdir():
+        if path.is_file():
+            path.unlink()
+
+def benchmark_storage(timings: Timings, count: int, seed: int):
+    """Loading the JSON file, indexing, saving and loading a binary snapshot, filters and balances"""
+    from benchmarks.synthetic import write_synthetic_ledger
+    from core.config import DATA_DIR, TRANSACTIONS_FILE
+    from core.ledger import Ledger
+    from utils.date_filter import filter_transactions_by_date
+    from utils.file_utils import load_transactions, save_transactions
+
+    clear_data(DATA_DIR)
+    write_synthetic_ledger(TRANSACTIONS_FILE, count, seed)
+
+    transactions = timings.measure("load_transactions_json", lambda: list(load_transactions()))
+    ledger = timings.measure("ledger_load", lambda: Ledger(transactions))
+    timings.measure("save_transactions", lambda: save_transactions(ledger.transactions))
+    store = timings.measure("load_transactions_snapshot", load_transactions)
+    timings.measure("ledger_load_snapshot", lambda: Ledger(store))
+
+    # The middle tenth of the ledger's dates
+    start, end = transactions[count * 45 // 100]["date"], transactions[count * 55 // 100]["date"]
+    timings.measure("filter_transactions_by_date", lambda: filter_transactions_by_date(transactions, start, end))
+    timings.measure("filter_by_date", lambda: ledger.filter_by_date(start, end), setup=ledger.queries.clear)
+    results = timings.measure("search", lambda: ledger.search(SEARCH_TERM), setup=ledger.queries.clear)
+
+    def search_prefix():
+        ledger.queries.clear()
+        ledger.search(SEARCH_TERM[:3])
+    timings.measure("search_refine", lambda: ledger.search(SEARCH_TERM), setup=search_prefix)
+    timings.measure("running_balances", ledger.analytics.running_balances)
+    timings.measure("view_balances", lambda: ledger.view_balances(results))
+    return ledger
+
+def benchmark_display(timings: Timings, mock: bool):
+    """The app started on the snapshot saved by benchmark_storage, then redraws, searches and sorts"""
+    from core.app import ModernTransactionApp
+
+    class BenchmarkApp(ModernTransactionApp):
+        def check_first_time(self):
+            # No passcode prompt
+            pass
+
+    root = make_root(mock)
+    errors = []
+
+    def wait(condition: Callable[[], bool]):
+        while not condition():
+            root.update()
+            time.sleep(0.0005)
+
+    def scenario():
+        try:
+            app = timings.measure("app_startup", lambda: BenchmarkApp(root), repeat=1)
+            timings.measure("app_loading", lambda: wait(lambda: not app.loading and app.display_data is app.ledger),
+                            repeat=1)
+            tree_calls = (lambda: app.tree.calls) if mock else None
+
+            timings.measure("update_display", app.update_display, counter=tree_calls)
+            timings.measure("scroll_100_rows", lambda: [app.table.yview("scroll", 1, "units") for _ in range(100)],
+                            counter=tree_calls)
+            timings.measure("scroll_to_middle", lambda: app.table.yview("moveto", 0.5),
+                            setup=lambda: app.table.yview("moveto", 0), counter=tree_calls)
+
+            def clear_search():
+                app.search_var.set("")
+                app.quick_search()
+                app.ledger.queries.clear()
+
+            def search():
+                app.search_var.set(SEARCH_TERM)
+                app.quick_search()
+                wait(lambda: app.search_future is None and app.display_query is not None)
+            timings.measure("quick_search", search, setup=clear_search, counter=tree_calls)
+            timings.measure("calculate_account_balance", lambda: app.calculate_account_balance("pan"))
+            clear_search()
+
+            timings.measure("sort_by_column", lambda: app.sort_by_column("description"),
+                            setup=lambda: app.ledger.sort_index.rebuild(app.ledger.transactions),
+                            counter=tree_calls)
+            timings.measure("sort_reverse", lambda: app.sort_by_column("description"), counter=tree_calls)
+            app.saver.close()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            root.quit()
+
+    # The app's workers report back with root.after, which needs a running main loop
+    root.after(0, scenario)
+    root.mainloop()
+    root.destroy()
+    if errors:
+        raise errors[0]
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(previous: Dict, current: Dict):
+    """Print the median of each operation in both runs and their ratio"""
+    print(f"\n{'size':>9} {'operation':<28} {'before ms':>10} {'after ms':>10} {'ratio':>7}")
+    for size, operations in current["results"].items():
+        for name, timing in operations.items():
+            before = previous["results"].get(size, {}).get(name)
+            if before is None:
+                continue
+            ratio = timing["median"] / before["median"] if before["median"] else float("inf")
+            print(f"{size:>9} {name:<28} {before['median'] * 1000:10.2f} {timing['median'] * 1000:10.2f} "
+                  f"{ratio:7.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app on synthetic ledgers")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated ledger sizes (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each operation (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic ledgers")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", type=Path, metavar="RESULTS", help="earlier results to compare with")
+    parser.add_argument("--mock-display", action="store_true", help="mock the widgets even with a display")
+    parser.add_argument("--no-display", action="store_true", help="skip the display benchmarks")
+    args = parser.parse_args(argv)
+    sizes = [int(size.replace("_", "")) for size in args.sizes.split(",")]
+
+    # A scratch data folder, set before the app's modules read their configuration
+    scratch_dir = Path(tempfile.mkdtemp(prefix="pas-benchmark-"))
+    os.environ["PAS_DATA_DIR"] = str(scratch_dir)
+    from core.analytics import ENGINE, np
+    from core.config import INSTRUMENT
+
+    mock = args.mock_display or not display_available()
+    if mock and not args.no_display:
+        install_mock_display()
+
+    meta = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__ if np is not None else None,
+        "analytics_engine": ENGINE,
+        "display": None if args.no_display else "mock" if mock else "tk",
+        # Instrumentation (PAS_INSTRUMENT=1) slows everything down with tracemalloc
+        "instrumented": INSTRUMENT,
+        "repeat": args.repeat,
+        "seed": args.seed,
+    }
+    report = {"meta": meta, "results": {}}
+    try:
+        for count in sizes:
+            print(f"{count} transactions", flush=True)
+            timings = Timings(args.repeat)
+            benchmark_storage(timings, count, args.seed)
+            if not args.no_display:
+                benchmark_display(timings, mock)
+            report["results"][str(count)] = timings.results
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    output = args.output or RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Reproducible synthetic ledgers for benchmarks.
+
+The same count and seed always give the same transactions, written in the
+``transactions.json`` format that ``load_transactions`` reads (a first-run
+file, before the app converts it to a binary snapshot).
+"""
+import argparse
+import json
+import random
+from collections import deque
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterator
+
+from core.aggregates import LedgerAggregates
+from core.config import STARTUP_PAGE_SIZE
+from utils.atomic_file import atomic_write
+from utils.file_utils import SNAPSHOT_VERSION
+
+ACCOUNTS = ["Al Rajhi Bank", "SNB", "Riyad Bank", "Employer", "Landlord", "STC", "SEC Electricity",
+            "Panda", "Danube", "Tamimi Markets", "Jarir", "Extra", "Careem", "Uber", "Aldrees",
+            "Starbucks", "Kudu", "Noon", "Amazon", "IKEA"]
+DESCRIPTIONS = ["Salary", "Rent", "Groceries", "Electricity bill", "Mobile bill", "Fuel", "Coffee",
+                "Dinner", "Books", "Furniture", "Transfer", "Refund", "Taxi", "Online order", "Gift"]
+START_DATE = date(2015, 1, 1)
+
+
+def synthetic_transactions(count: int, seed: int = 0) -> Iterator[Dict]:
+    """``count`` transactions in date order, with ids, amounts in halalas and a
+    balance that never goes negative. About a third are deposits."""
+    rng = random.Random(seed)
+    day = START_DATE
+    # Several transactions a day, spreading even 5M rows over a few decades
+    per_day = max(1, count // 3650)
+    balance = 0
+    for transaction_id in range(1, count + 1):
+        if transaction_id % per_day == 0:
+            day += timedelta(days=1)
+        deposit = rng.random() < 0.33
+        amount = rng.randint(100, 2_000_000 if deposit else 500_000)
+        if not deposit and amount > balance:
+            deposit = True
+        balance += amount if deposit else -amount
+        account = rng.choice(ACCOUNTS)
+        yield {
+            "id": transaction_id,
+            "date": day.isoformat(),
+            "type": "Deposit" if deposit else "Withdrawal",
+            "amount": amount,
+            "from_account": account if deposit else "",
+            "to_account": "" if deposit else account,
+            "description": f"{rng.choice(DESCRIPTIONS)} {rng.randint(1, 999)}"
+        }
+
+def write_synthetic_ledger(file_path: Path, count: int, seed: int = 0):
+    """Write a synthetic ledger as a version 2 JSON snapshot, one transaction at a time.
+    The transactions are generated twice: once for the summary header, once to write them.
+    """
+    summary = LedgerAggregates()
+    recent = deque(maxlen=STARTUP_PAGE_SIZE)
+    for transaction in synthetic_transactions(count, seed):
+        summary.add(transaction)
+        recent.append(transaction)
+
+    header = {"version": SNAPSHOT_VERSION, "summary": summary.totals(), "balance": summary.balance,
+              "recent": list(recent)}
+    with atomic_write(Path(file_path), 'w', fsync=False, encoding='utf-8') as f:
+        # The header object, left open for the transactions array
+        f.write(json.dumps(header)[:-1] + ', "transactions": [\n')
+        for transaction in synthetic_transactions(count, seed):
+            if transaction["id"] > 1:
+                f.write(",\n")
+            f.write(json.dumps(transaction))
+        f.write("\n]}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic transactions.json")
+    parser.add_argument("count", type=int, help="number of transactions")
+    parser.add_argument("file", type=Path, help="output file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_synthetic_ledger(args.file, args.count, args.seed)
@@ -0,0 +1,50 @@
+import argparse
+import sys
+
+from core.ledger import Ledger
+from core.query import Query
+from utils.exporter import export_transactions
+from utils.file_utils import load_transactions
+from utils.money import format_amount
+
+
+def main(argv=None):
+    """List the transactions matching a search, date range and type, like the app's filters"""
+    parser = argparse.ArgumentParser(description="Query the saved transactions")
+    parser.add_argument("search", nargs="?", default="",
+                        help="text to find in account names and descriptions")
+    parser.add_argument("--from", dest="from_date", metavar="YYYY-MM-DD", help="first date of the range")
+    parser.add_argument("--to", dest="to_date", metavar="YYYY-MM-DD", help="last date of the range")
+    parser.add_argument("--type", dest="transaction_type", choices=("Deposit", "Withdrawal"))
+    parser.add_argument("--export", metavar="FILE",
+                        help="write the results to a .csv, .jsonl, .html or .json file instead of listing them")
+    args = parser.parse_args(argv)
+
+    ledger = Ledger()
+    ledger.load(load_transactions())
+    query = Query(text=args.search, from_date=args.from_date, to_date=args.to_date,
+                  transaction_type=args.transaction_type)
+    try:
+        results = ledger.filter(query)
+    except ValueError:
+        parser.error("invalid date, please use YYYY-MM-DD")
+
+    if args.export:
+        try:
+            export_transactions(results, args.export)
+        except (OSError, ValueError) as e:
+            parser.error(f"could not export: {e}")
+        print(f"{len(results)} transactions exported to {args.export}", file=sys.stderr)
+        return
+
+    # Balances count only the listed transactions, as in the app
+    balances = ledger.view_balances(results)
+    for transaction, balance in zip(results, balances):
+        print("\t".join((transaction["date"], transaction["type"], format_amount(transaction["amount"]),
+                         transaction["from_account"], transaction["to_account"],
+                         transaction["description"], format_amount(balance))))
+    print(f"{len(results)} transactions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import heapq
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+
+def normalize_account(name: str) -> str:
+    """Key used to group spellings of the same counterparty"""
+    return " ".join(name.split()).casefold()
+
+
+class AccountSummary(NamedTuple):
+    name: str
+    received: int  # deposits from the account (minor units)
+    paid: int      # withdrawals to the account (minor units)
+    count: int
+
+    @property
+    def balance(self) -> int:
+        return self.received - self.paid
+
+
+class AccountLedger:
+    """Per-counterparty balances keyed by normalized account name.
+
+    Maintained as transactions are added, edited or removed. Names are also
+    kept sorted so accounts can be looked up by prefix with a bisection.
+    """
+
+    def __init__(self, transactions: Iterable[Dict] = ()):
+        self.rebuild(transactions)
+
+    def rebuild(self, transactions: Iterable[Dict]):
+        self._accounts: Dict[str, AccountSummary] = {}
+        # Sorted once at the end instead of on every new account
+        self._keys: Optional[List[str]] = None
+        for transaction in transactions:
+            self.add(transaction)
+        self._keys = sorted(self._accounts)
+
+    def rebuild_from_store(self, store):
+        """Rebuild from the columns of a TransactionStore: rows are summed by
+        account string code, then the codes are merged by normalized name"""
+        # [received, paid, count] by code, in the order accounts first appear
+        totals: Dict[int, List[int]] = {}
+        is_deposit = store.is_deposit
+        for position, (amount, from_code, to_code) in enumerate(
+                zip(store.amounts, store.from_accounts, store.to_accounts)):
+            deposit = is_deposit(position)
+            code = from_code if deposit else to_code
+            entry = totals.get(code)
+            if entry is None:
+                entry = totals[code] = [0, 0, 0]
+            entry[0 if deposit else 1] += amount
+            entry[2] += 1
+
+        self._accounts = {}
+        for code, (received, paid, count) in totals.items():
+            name = store.strings.decode(code)
+            if not name.strip():
+                continue
+            key = normalize_account(name)
+            summary = self._accounts.get(key)
+            if summary is None:
+                self._accounts[key] = AccountSummary(name.strip(), received, paid, count)
+            else:
+                self._accounts[key] = AccountSummary(summary.name, summary.received + received,
+                                                     summary.paid + paid, summary.count + count)
+        self._keys = sorted(self._accounts)
+
+    def add(self, transaction: Dict):
+        self._apply(transaction, 1)
+
+    def remove(self, transaction: Dict):
+        self._apply(transaction, -1)
+
+    def update(self, old: Dict, new: Dict):
+        self._apply(old, -1)
+        self._apply(new, 1)
+
+    def get(self, account_name: str) -> Optional[AccountSummary]:
+        return self._accounts.get(normalize_account(account_name))
+
+    def balance(self, account_name: str) -> int:
+        """Deposits from the account minus withdrawals to it"""
+        summary = self.get(account_name)
+        return summary.balance if summary else 0
+
+    def prefix(self, prefix: str) -> List[AccountSummary]:
+        """Accounts whose normalized name starts with ``prefix``"""
+        key = normalize_account(prefix)
+        start = bisect_left(self._keys, key)
+        matches = []
+        # The matches follow ``start``; the tail of the list is not copied
+        for name in islice(self._keys, start, None):
+            if not name.startswith(key):
+                break
+            matches.append(self._accounts[name])
+        return matches
+
+    def top(self, count: int = 10) -> List[AccountSummary]:
+        """Counterparties with the largest amounts moved (received plus paid)"""
+        return heapq.nlargest(count, self._accounts.values(), key=lambda a: a.received + a.paid)
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def _apply(self, transaction: Dict, sign: int):
+        if transaction["type"] == "Deposit":
+            name = transaction.get("from_account")
+            received, paid = transaction["amount"] * sign, 0
+        else:
+            name = transaction.get("to_account")
+            received, paid = 0, transaction["amount"] * sign
+        if not name or not name.strip():
+            return
+
+        key = normalize_account(name)
+        summary = self._accounts.get(key)
+        if summary is None:
+            if sign < 0:
+                return
+            self._accounts[key] = AccountSummary(name.strip(), received, paid, sign)
+            if self._keys is not None:
+                insort(self._keys, key)
+            return
+
+        count = summary.count + sign
+        if count <= 0:
+            del self._accounts[key]
+            index = bisect_left(self._keys, key)
+            if index < len(self._keys) and self._keys[index] == key:
+                del self._keys[index]
+            return
+        self._accounts[key] = AccountSummary(summary.name, summary.received + received,
+                                             summary.paid + paid, count)
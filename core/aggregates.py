@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, Optional
+
+from utils.money import MAX_MINOR
+
+# Why a change is refused by ``LedgerAggregates.accepts``
+BALANCE_TOO_LARGE = "Balance would be too large to store"
+
+
+class LedgerAggregates:
+    """Balance, totals and counts of the ledger.
+
+    Updated in O(1) for every added, edited or removed transaction, so the
+    balance label and the statistics bar never rescan the ledger.
+    """
+
+    def __init__(self, transactions: Iterable[Dict] = ()):
+        self.rebuild(transactions)
+
+    def rebuild(self, transactions: Iterable[Dict]):
+        # Amounts in minor units
+        self.total_deposits = 0
+        self.total_withdrawals = 0
+        self.deposit_count = 0
+        self.withdrawal_count = 0
+        for transaction in transactions:
+            self.add(transaction)
+
+    def set_totals(self, total_deposits: int, total_withdrawals: int,
+                   deposit_count: int, withdrawal_count: int):
+        """Use totals computed elsewhere (e.g. by the analytics engine)"""
+        self.total_deposits = total_deposits
+        self.total_withdrawals = total_withdrawals
+        self.deposit_count = deposit_count
+        self.withdrawal_count = withdrawal_count
+
+    def totals(self) -> Dict[str, int]:
+        """The values accepted by ``set_totals``"""
+        return {"total_deposits": self.total_deposits, "total_withdrawals": self.total_withdrawals,
+                "deposit_count": self.deposit_count, "withdrawal_count": self.withdrawal_count}
+
+    def add(self, transaction: Dict):
+        self._apply(transaction, 1)
+
+    def remove(self, transaction: Dict):
+        self._apply(transaction, -1)
+
+    def update(self, old: Dict, new: Dict):
+        """Replace the contribution of ``old`` by that of ``new``"""
+        self._apply(old, -1)
+        self._apply(new, 1)
+
+    def accepts(self, old: Optional[Dict], new: Optional[Dict]) -> bool:
+        """Whether replacing ``old`` by ``new`` (either may be None) keeps the totals
+        within the 64-bit columns; every running balance lies between them"""
+        deposits, withdrawals = self.total_deposits, self.total_withdrawals
+        for transaction, sign in ((old, -1), (new, 1)):
+            if transaction is not None:
+                if transaction["type"] == "Deposit":
+                    deposits += transaction["amount"] * sign
+                else:
+                    withdrawals += transaction["amount"] * sign
+        return deposits <= MAX_MINOR and withdrawals <= MAX_MINOR
+
+    @property
+    def balance(self) -> int:
+        return self.total_deposits - self.total_withdrawals
+
+    @property
+    def count(self) -> int:
+        return self.deposit_count + self.withdrawal_count
+
+    def _apply(self, transaction: Dict, sign: int):
+        amount = transaction["amount"] * sign
+        if transaction["type"] == "Deposit":
+            self.total_deposits += amount
+            self.deposit_count += sign
+        else:
+            self.total_withdrawals += amount
+            self.withdrawal_count += sign
@@ -0,0 +1,105 @@
+from array import array
+from itertools import accumulate, compress
+from typing import Optional, Sequence, Tuple
+
+from core.config import ANALYTICS_ENGINE
+from core.transaction_store import TransactionStore
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: the pure-Python engine is used instead
+    np = None
+
+# Engine actually in use: "numpy" when available, unless "python" is forced
+ENGINE = "numpy" if np is not None and ANALYTICS_ENGINE != "python" else "python"
+
+
+def _to_numpy(column: array, dtype) -> "np.ndarray":
+    # Copied, so the array stays resizable (a live buffer export would lock it)
+    return np.frombuffer(column, dtype=dtype).copy() if len(column) else np.zeros(0, dtype=dtype)
+
+def _to_array(values: "np.ndarray") -> array:
+    result = array('q')
+    result.frombytes(values.astype(np.int64, copy=False).tobytes())
+    return result
+
+
+class AnalyticsEngine:
+    """Balances, totals and filters computed over the columns of a TransactionStore.
+
+    With NumPy, signed amounts, dates and types are held as arrays (rebuilt
+    when the store changes) so balances are a ``cumsum`` and filters are
+    boolean masks. Without it the same results come from plain loops over
+    the columns. Positions and balances are returned as ``array('q')`` in
+    both cases.
+    """
+
+    def __init__(self, store: TransactionStore, engine: str = ENGINE):
+        self.store = store
+        self.vectorized = engine == "numpy" and np is not None
+        self._changes = -1
+        self._signed = self._dates = self._deposits = None
+
+    def running_balances(self, positions: Optional[Sequence[int]] = None) -> array:
+        """Running balance over the rows at ``positions`` (all rows by default)"""
+        if self.vectorized:
+            signed = self._columns()[0]
+            if positions is not None:
+                signed = signed[np.asarray(positions, dtype=np.int64)]
+            return _to_array(np.cumsum(signed, dtype=np.int64))
+
+        store = self.store
+        amounts, is_deposit = store.amounts, store.is_deposit
+        if positions is None:
+            positions = range(len(store))
+        return array('q', accumulate(amounts[p] if is_deposit(p) else -amounts[p] for p in positions))
+
+    def totals(self) -> Tuple[int, int, int, int]:
+        """Total deposits, total withdrawals, deposit count and withdrawal count"""
+        if self.vectorized:
+            signed, _, deposits = self._columns()
+            total_deposits = int(signed[deposits].sum())
+            total_withdrawals = -int(signed[~deposits].sum())
+            deposit_count = int(np.count_nonzero(deposits))
+            return total_deposits, total_withdrawals, deposit_count, len(signed) - deposit_count
+
+        store = self.store
+        total_deposits = total_withdrawals = deposit_count = 0
+        for position, amount in enumerate(store.amounts):
+            if store.is_deposit(position):
+                total_deposits += amount
+                deposit_count += 1
+            else:
+                total_withdrawals += amount
+        return total_deposits, total_withdrawals, deposit_count, len(store) - deposit_count
+
+    def type_positions(self, transaction_type: str) -> array:
+        """Positions of the deposits or of the withdrawals, in ledger order"""
+        deposit = transaction_type == "Deposit"
+        if self.vectorized:
+            deposits = self._columns()[2]
+            return _to_array(np.flatnonzero(deposits if deposit else ~deposits))
+
+        is_deposit = self.store.is_deposit
+        return array('q', (p for p in range(len(self.store)) if is_deposit(p) == deposit))
+
+    def date_positions(self, start: int, end: int) -> array:
+        """Positions of the rows dated from ordinal ``start`` to ``end`` inclusive"""
+        if self.vectorized:
+            dates = self._columns()[1]
+            return _to_array(np.flatnonzero((dates >= start) & (dates <= end)))
+
+        dates = self.store.dates
+        return array('q', compress(range(len(dates)), (start <= d <= end for d in dates)))
+
+    def _columns(self):
+        store = self.store
+        if self._changes != store.changes:
+            deposits = np.unpackbits(np.frombuffer(bytes(store.deposits), dtype=np.uint8),
+                                     count=len(store), bitorder="little").astype(bool)
+            amounts = _to_numpy(store.amounts, np.int64)
+            self._signed = np.where(deposits, amounts, -amounts)
+            self._dates = _to_numpy(store.dates, np.int32)
+            self._deposits = deposits
+            self._changes = store.changes
+        return self._signed, self._dates, self._deposits
@@ -1,14 +1,27 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, Frame, Label, Entry, Button
+from tkinter import ttk, filedialog, messagebox, Frame, Label, Entry, Button
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
 
-from core.config import APP_TITLE, APP_ICON
+from core.config import APP_TITLE, APP_ICON, CLOSE_TIMEOUT_S, SEARCH_DEBOUNCE_MS, SLOW_OPERATION_MS
+from core.balance_index import signed_amount
+from core.ledger import Ledger
+from core.query import Query
+from core.transaction_store import TransactionView
 from utils.validation import validate_icon_path
-from utils.file_utils import load_transactions, save_transactions, load_passcode, save_passcode
-from utils.date_filter import filter_transactions_by_date
+from utils.money import format_amount
+from utils.file_utils import (load_summary, load_transactions, needs_compaction, journal_size, needs_snapshot,
+                              load_passcode, save_passcode)
+from utils.saver import BackgroundSaver
+from utils.importer import import_file
+from utils.exporter import EXPORT_FORMATS, export_transactions
+from utils.gui_utils import VirtualTreeview
+from utils.instrumentation import count_rows, instrumentation, instrumented
 from dialogs.passcode_dialog import PasscodeDialog
 from dialogs.transaction_dialog import EnhancedTransactionDialog
 from dialogs.edit_dialog import EditTransactionDialog
+from dialogs.counterparties_dialog import TopCounterpartiesDialog
 import sys
 
 class ModernTransactionApp:
@@ -26,24 +39,73 @@ class ModernTransactionApp:
         self.root.configure(bg='#f0f0f0')
         self.root.resizable(True, True)
         
-        # Make window full screen
-        self.root.state('zoomed')
+        # Make window full screen ("zoomed" is not a window state on X11)
+        try:
+            self.root.state('zoomed')
+        except tk.TclError:
+            self.root.attributes('-zoomed', True)
         
         # Application data
-        self.transactions = []
-        self.balance = 0.0
+        self.ledger = Ledger()
+        
+        # Changes written to the journal since the last full snapshot
+        self.pending_changes = 0
+        
+        # Changes are saved by a worker thread; its outcome is polled on the Tk thread
+        self.saver = BackgroundSaver()
+        self.save_after_id = None
+        self.save_error = None
+        
+        # Date range applied with the "Filter by Date" button
+        self.date_range = (None, None)
+        
+        # Searches run in a worker thread; only the latest one is displayed
+        self.search_executor = ThreadPoolExecutor(max_workers=1)
+        self.search_future = None
+        self.search_generation = 0
+        self.search_after_id = None
+        
+        # The ledger is read in the background; until then the table shows
+        # the latest transactions and the totals from the snapshot header
+        self.load_executor = ThreadPoolExecutor(max_workers=1)
+        
+        # Exports are written in the background, from a copy of the ledger
+        self.export_executor = ThreadPoolExecutor(max_workers=1)
+        
+        # Statements are imported in the background, into the ledger itself;
+        # editing waits until the import is finished
+        self.import_executor = ThreadPoolExecutor(max_workers=1)
+        self.importing = False
+        self.import_future = None
+        self.import_added = 0
+        self.import_cancel = threading.Event()
+        self.load_future = None
+        self.load_progress = 0.0
+        self.loading = False
+        
+        # Rows currently shown in the table (all transactions or a filtered view)
+        # and the running balance of each of them
+        self.display_data = []
+        self.display_filtered = False
+        self.display_balances = []
+        # Query whose results are displayed (None for the whole ledger)
+        self.display_query = None
+        
+        # Column the table is sorted by (None for ledger order), and the
+        # indexes into display_data in that order
+        self.sort_column = None
+        self.sort_descending = False
+        self.display_order = None
         
         # Check if first time running
         self.check_first_time()
         
-        # Load previous data
-        self.load_data()
-        
         # Create user interface
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        # Update display
-        self.update_display()
+        # Load previous data (displayed as soon as it is available)
+        self.load_data()
     
     def check_first_time(self):
         """Check if this is the first time running the app"""
@@ -64,8 +126,10 @@ class ModernTransactionApp:
         if dialog.result:
             passcode = dialog.result
             # Save passcode to file
-            save_passcode(passcode)
-            messagebox.showinfo("Success", "passcode setup completed successfully!")
+            if save_passcode(passcode):
+                messagebox.showinfo("Success", "passcode setup completed successfully!")
+            else:
+                messagebox.showerror("Error", "Could not save the passcode. You will be asked to set it again next time.")
 
     def verify_passcode(self):
         """Verify passcode for returning users"""
@@ -87,6 +151,8 @@ class ModernTransactionApp:
                 messagebox.showerror("Error", "Incorrect passcode. Please try again.")
     
     def create_widgets(self):
+        self.create_menu()
+        
         # Create main frame with modern design
         main_frame = Frame(self.root, bg='#f0f0f0', padx=20, pady=20)
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -127,6 +193,21 @@ class ModernTransactionApp:
               bg='#e67e22', fg='white', font=("Arial", 12, "bold"), 
               width=15, height=1, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
         
+        # Top counterparties button
+        Button(control_frame, text="Top Counterparties", command=self.show_top_counterparties, 
+              bg='#16a085', fg='white', font=("Arial", 12, "bold"), 
+              width=16, height=1, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
+        
+        # Bulk import from a bank statement
+        Button(control_frame, text="Import Statement", command=self.import_statement, 
+              bg='#34495e', fg='white', font=("Arial", 12, "bold"), 
+              width=16, height=1, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
+        
+        # Export of the displayed transactions
+        Button(control_frame, text="Export", command=self.export_view, 
+              bg='#7f8c8d', fg='white', font=("Arial", 12, "bold"), 
+              width=10, height=1, relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
+        
         # Date filter frame
         date_filter_frame = Frame(main_frame, bg='#f0f0f0')
         date_filter_frame.pack(fill=tk.X, pady=(0, 15))
@@ -162,7 +243,7 @@ class ModernTransactionApp:
         Label(search_frame, text="Quick search:", font=("Arial", 11, "bold")).pack(side=tk.LEFT, padx=5)
         
         self.search_var = tk.StringVar()
-        self.search_var.trace('w', self.quick_search)
+        self.search_var.trace('w', self.schedule_search)
         search_entry = Entry(search_frame, textvariable=self.search_var, font=("Arial", 12), width=28)
         search_entry.pack(side=tk.LEFT, padx=8)
         search_entry.bind("<Return>", lambda e: self.quick_search())
@@ -193,21 +274,20 @@ class ModernTransactionApp:
         
         # Define columns in the requested order
         columns = ("date", "deposit", "from_account", "withdrawal", "to_account", "description", "balance")
-        self.tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=20)
+        self.table = VirtualTreeview(table_frame, columns, self.build_row, show="headings", height=20)
+        self.tree = self.table.tree
 
         style = ttk.Style()
         style.configure("Treeview.Heading", font=("Arial", 12, "bold"))
         style.configure("Treeview", font=("Arial", 11, "bold"))
 
         
-        # Define headings in the requested order
-        self.tree.heading("date", text="Date")
-        self.tree.heading("deposit", text="Deposit")
-        self.tree.heading("from_account", text="From")
-        self.tree.heading("withdrawal", text="Withdrawal")
-        self.tree.heading("to_account", text="To")
-        self.tree.heading("description", text="Description")
-        self.tree.heading("balance", text="Balance")
+        # Define headings in the requested order (clicking one sorts the table)
+        self.headings = {"date": "Date", "deposit": "Deposit", "from_account": "From",
+                         "withdrawal": "Withdrawal", "to_account": "To",
+                         "description": "Description", "balance": "Balance"}
+        for column, text in self.headings.items():
+            self.tree.heading(column, text=text, command=lambda column=column: self.sort_by_column(column))
         
         # Define columns with equal widths for deposit and withdrawal
         self.tree.column("date", width=150, anchor=tk.CENTER)
@@ -225,12 +305,9 @@ class ModernTransactionApp:
         self.tree.tag_configure('deposit', foreground="#32CD32")
         self.tree.tag_configure('withdrawal', foreground="#FF3030")
         
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        
+        # Scrollbar (drives the virtual table, not the Treeview itself)
+        self.table.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Message when no results found
         self.no_results_label = Label(table_frame, text="No results found", 
@@ -247,9 +324,97 @@ class ModernTransactionApp:
         stats_label = Label(stats_frame, textvariable=self.stats_var, 
                            font=("Arial", 11), bg='#f0f0f0', fg='#2c3e50')
         stats_label.pack(side=tk.LEFT)
+        
+        # Loading progress (shown while the ledger is read in the background)
+        self.load_status_var = tk.StringVar()
+        self.load_status_label = Label(stats_frame, textvariable=self.load_status_var,
+                                       font=("Arial", 11), bg='#f0f0f0', fg='#7f8c8d')
+        self.load_progress_bar = ttk.Progressbar(stats_frame, length=200, mode='determinate', maximum=100)
+        self.import_cancel_button = Button(stats_frame, text="Cancel", command=self.cancel_import,
+                                           font=("Arial", 10), relief=tk.FLAT, bg='#bdc3c7', cursor="hand2")
+        
+        # Shown while the latest changes could not be saved
+        self.save_status_var = tk.StringVar()
+        self.save_status_label = Label(stats_frame, textvariable=self.save_status_var,
+                                       font=("Arial", 11, "bold"), bg='#f0f0f0', fg='#c0392b')
+        
+        # Latest timings of the instrumented operations (Tools > Performance Monitor)
+        self.performance_var = tk.StringVar()
+        self.performance_label = Label(main_frame, textvariable=self.performance_var, font=("Courier", 10),
+                                       bg='#f0f0f0', fg='#2c3e50', justify=tk.LEFT, anchor=tk.W)
+        self.performance_after_id = None
+        if instrumentation.enabled:
+            self.show_performance_panel()
+    
+    def create_menu(self):
+        """Tools menu: the performance monitor and on-demand profiling"""
+        menubar = tk.Menu(self.root)
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        self.instrument_var = tk.BooleanVar(value=instrumentation.enabled)
+        self.profile_var = tk.BooleanVar(value=False)
+        tools_menu.add_checkbutton(label="Performance Monitor", variable=self.instrument_var,
+                                   command=self.toggle_instrumentation)
+        tools_menu.add_checkbutton(label="Record Profile", variable=self.profile_var,
+                                   command=self.toggle_profile)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+        self.root.config(menu=menubar)
+    
+    def toggle_instrumentation(self):
+        """Start or stop timing the hot paths, with the panel showing the latest timings"""
+        if self.instrument_var.get():
+            instrumentation.enable()
+            self.show_performance_panel()
+        else:
+            if instrumentation.profiling:
+                self.profile_var.set(False)
+                self.toggle_profile()
+            instrumentation.disable()
+            if self.performance_after_id is not None:
+                self.root.after_cancel(self.performance_after_id)
+                self.performance_after_id = None
+            self.performance_label.pack_forget()
+    
+    def toggle_profile(self):
+        """Profile the instrumented operations until unchecked, then save the profile"""
+        if self.profile_var.get():
+            if not instrumentation.enabled:
+                self.instrument_var.set(True)
+                self.toggle_instrumentation()
+            instrumentation.start_profile()
+            return
+        try:
+            file_path = instrumentation.stop_profile()
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save the profile: {e}")
+            return
+        if file_path is None:
+            messagebox.showinfo("Profile", "No instrumented operation ran while profiling.")
+        else:
+            messagebox.showinfo("Profile", f"Profile saved to:\n{file_path}\n\n"
+                                f"Read it with: python -m pstats \"{file_path}\"")
+    
+    def show_performance_panel(self):
+        self.performance_label.pack(fill=tk.X, pady=(10, 0))
+        self.update_performance_panel()
+    
+    def update_performance_panel(self):
+        """Refresh the latest timings twice a second while instrumentation is on"""
+        lines = []
+        for record in instrumentation.recent(6):
+            rows = "" if record.rows is None else f"{record.rows} rows"
+            allocated = "" if record.allocated is None else f"{record.allocated / 1024:+.0f} KB"
+            slow = " SLOW" if record.seconds * 1000 >= SLOW_OPERATION_MS else ""
+            lines.append(f"{record.name:<20} {record.seconds * 1000:9.1f} ms {rows:>14} {allocated:>12}  "
+                         f"{record.thread}{slow}")
+        if instrumentation.profiling:
+            lines.append("Recording profile...")
+        self.performance_var.set("\n".join(lines) or "No operations recorded yet")
+        self.performance_after_id = self.root.after(500, self.update_performance_panel)
     
     def filter_by_date(self):
-        """Filter transactions by date range"""
+        """Filter transactions by date range (combined with the search and type filters)"""
+        if not self.ensure_loaded():
+            return
         from_date = self.from_date_var.get().strip()
         to_date = self.to_date_var.get().strip()
         
@@ -259,70 +424,46 @@ class ModernTransactionApp:
             return
         
         try:
-            # Validate date format
-            datetime.strptime(from_date, "%Y-%m-%d")
-            datetime.strptime(to_date, "%Y-%m-%d")
+            Query(from_date=from_date, to_date=to_date).date_span()
         except ValueError:
             messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD")
             return
         
-        # Filter transactions using the external function
-        filtered_transactions = filter_transactions_by_date(self.transactions, from_date, to_date)
-        
-        if filtered_transactions:
-            self.update_display(filtered_transactions)
-        else:
-            self.update_display([])
-            messagebox.showinfo("Filter Results", 
-                              "No transactions found in the selected date range")
+        self.date_range = (from_date, to_date)
+        self.quick_search()
     
     def clear_date_filter(self):
-        """Clear date filter and show all transactions"""
+        """Clear date filter and show the transactions matching the other filters"""
         self.from_date_var.set("")
         self.to_date_var.set("")
-        self.update_display()
+        self.date_range = (None, None)
+        self.quick_search()
+    
+    def get_selected_transaction(self):
+        """Return the transaction selected in the table, or None"""
+        transaction_id = self.table.selected_key()
+        if transaction_id is None:
+            return None
+        return self.ledger.get(transaction_id)
     
     def delete_transaction(self):
         """Delete selected transaction after passcode confirmation"""
-        selected = self.tree.selection()
-        if not selected:
+        if not self.ensure_loaded():
+            return
+        original_transaction = self.get_selected_transaction()
+        if original_transaction is None:
             messagebox.showwarning("Warning", "Please select a transaction to delete")
             return
         
-        item = self.tree.item(selected[0])
-        values = item["values"]
-        
-        # Find the original transaction in the list using a unique identifier
-        date = values[0]
-        deposit = values[1]
-        withdrawal = values[3]
-        description = values[5]
-        
-        # Determine the amount and type
-        amount = float(deposit.replace(",", "")) if deposit != "0.00" else float(withdrawal.replace(",", ""))
-        transaction_type = "Deposit" if deposit != "0.00" else "Withdrawal"
-        
-        # Find the exact transaction
-        original_transaction = None
-        index = -1
-        
-        for i, transaction in enumerate(self.transactions):
-            if (transaction["date"] == date and 
-                transaction["amount"] == amount and 
-                transaction["description"] == description and 
-                transaction["type"] == transaction_type):
-                original_transaction = transaction
-                index = i
-                break
-        
-        if not original_transaction:
-            messagebox.showerror("Error", "Could not find the selected transaction")
-            return
+        date = original_transaction["date"]
+        amount = original_transaction["amount"]
+        description = original_transaction["description"]
+        transaction_type = original_transaction["type"]
         
         # Ask for confirmation
         confirm = messagebox.askyesno("Confirm Delete", 
                                      f"Are you sure you want to delete this {transaction_type.lower()} transaction?\n"
-                                     f"Date: {date}\nAmount: {amount} SAR\nDescription: {description}")
+                                     f"Date: {date}\nAmount: {self.format_currency(amount)} SAR\nDescription: {description}")
         
         if not confirm:
             return
@@ -341,56 +482,21 @@ class ModernTransactionApp:
             messagebox.showerror("Error", "Incorrect passcode. Deletion cancelled.")
             return
         
-        # Remove the transaction
-        deleted_transaction = self.transactions.pop(index)
-        
-        # Update the balance
-        if deleted_transaction["type"] == "Deposit":
-            self.balance -= deleted_transaction["amount"]
-        else:
-            self.balance += deleted_transaction["amount"]
+        # Remove the transaction (the ledger keeps the balance up to date)
+        deleted_transaction = self.ledger.delete(original_transaction["id"])
         
         # Save data and update display
-        self.save_data()
-        self.update_display()
+        self.save_data("delete", deleted_transaction, previous=deleted_transaction)
+        self.refresh_display()
         messagebox.showinfo("Success", "Transaction deleted successfully")
     
     def edit_transaction(self):
         """Edit selected transaction"""
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showwarning("Warning", "Please select a transaction to edit")
+        if not self.ensure_loaded():
             return
-        
-        item = self.tree.item(selected[0])
-        values = item["values"]
-        
-        # Find the original transaction in the list using a unique identifier
-        # We'll use the combination of date, amount, and description to identify the transaction
-        date = values[0]
-        deposit = values[1]
-        withdrawal = values[3]
-        description = values[5]
-        
-        # Determine the amount and type
-        amount = float(deposit.replace(",", "")) if deposit != "0.00" else float(withdrawal.replace(",", ""))
-        transaction_type = "Deposit" if deposit != "0.00" else "Withdrawal"
-        
-        # Find the exact transaction
-        original_transaction = None
-        index = -1
-        
-        for i, transaction in enumerate(self.transactions):
-            if (transaction["date"] == date and 
-                transaction["amount"] == amount and 
-                transaction["description"] == description and 
-                transaction["type"] == transaction_type):
-                original_transaction = transaction
-                index = i
-                break
-        
-        if not original_transaction:
-            messagebox.showerror("Error", "Could not find the selected transaction")
+        original_transaction = self.get_selected_transaction()
+        if original_transaction is None:
+            messagebox.showwarning("Warning", "Please select a transaction to edit")
             return
         
         # Open edit dialog with current values
@@ -398,69 +504,63 @@ class ModernTransactionApp:
         self.root.wait_window(dialog.top)
         
         if dialog.result:
-            # Get the updated values
+            # Get the updated values (the dialog validated the amount, in halalas)
             updated_amount, updated_from, updated_to, updated_desc = dialog.result
             
-            # Validate amount
-            try:
-                updated_amount = float(updated_amount)
-                if updated_amount <= 0:
-                    messagebox.showerror("Error", "Amount must be greater than zero")
-                    return
-            except ValueError:
-                messagebox.showerror("Error", "Amount must be a number")
-                return
-            
-            # Calculate the difference in balance
-            old_amount = original_transaction["amount"]
-            amount_difference = 0
-            
-            if original_transaction["type"] == "Deposit":
-                amount_difference = updated_amount - old_amount
-            else:
-                amount_difference = old_amount - updated_amount
-            
             # Check if withdrawal exceeds balance
-            if original_transaction["type"] == "Withdrawal" and updated_amount > (self.balance + old_amount):
+            old_amount = original_transaction["amount"]
+            if (original_transaction["type"] == "Withdrawal"
+                    and updated_amount > self.ledger.aggregates.balance + old_amount):
                 messagebox.showerror("Error", "Insufficient balance for this withdrawal amount")
                 return
+            if not self.ledger.aggregates.accepts(original_transaction,
+                                                  {**original_transaction, "amount": updated_amount}):
+                messagebox.showerror("Error", "Amount is too large: the balance could not be stored")
+                return
             
-            # Update the transaction
-            self.transactions[index]["amount"] = updated_amount
-            self.transactions[index]["from_account"] = updated_from
-            self.transactions[index]["to_account"] = updated_to
-            self.transactions[index]["description"] = updated_desc
-            
-            # Update the balance
-            if original_transaction["type"] == "Deposit":
-                self.balance += amount_difference
-            else:
-                self.balance += amount_difference
+            # Update the transaction (the ledger keeps the balance up to date)
+            previous_transaction = dict(original_transaction)
+            updated_transaction = self.ledger.update(original_transaction["id"],
+                                                     amount=updated_amount,
+                                                     from_account=updated_from,
+                                                     to_account=updated_to,
+                                                     description=updated_desc)
             
             # Save data and update display
-            self.save_data()
-            self.update_display()
+            self.save_data("update", updated_transaction, previous=previous_transaction)
+            self.refresh_display()
             messagebox.showinfo("Success", "Transaction updated successfully")
     
     def filter_by_operation(self, event=None):
         """Filter transactions by selected operation type"""
-        operation = self.operation_var.get()
-        
-        if operation == "All":
+        if not self.ensure_loaded():
+            return
+        self.quick_search()
+    
+    def current_query(self):
+        """Query combining the search term, the applied date range and the type filter"""
+        transaction_type = {"Deposit only": "Deposit",
+                            "Withdrawal only": "Withdrawal"}.get(self.operation_var.get())
+        from_date, to_date = self.date_range
+        return Query(text=self.search_var.get().strip(), from_date=from_date, to_date=to_date,
+                     transaction_type=transaction_type)
+    
+    def refresh_display(self):
+        """Show the ledger after a change, keeping the active filters.
+        The filters are run right away rather than in the search worker: the
+        displayed view holds positions from before the change and must not be
+        redrawn once they are stale.
+        """
+        query = self.current_query()
+        if query.is_empty():
             self.update_display()
-        elif operation == "Deposit only":
-            deposits = [t for t in self.transactions if t["type"] == "Deposit"]
-            self.update_display(deposits)
-        elif operation == "Withdrawal only":
-            withdrawals = [t for t in self.transactions if t["type"] == "Withdrawal"]
-            self.update_display(withdrawals)
+            return
+        self.cancel_search()
+        self.show_results(query, *self.run_search(query))
     
     def format_currency(self, amount):
-        """Format amount with thousand separators"""
-        try:
-            return "{:,.2f}".format(float(amount))
-        except:
-            return "0.00"
+        """Format an amount in halalas with thousand separators"""
+        return format_amount(amount)
     
     def add_deposit(self):
         self.add_transaction("Deposit")
@@ -469,22 +569,15 @@ class ModernTransactionApp:
         self.add_transaction("Withdrawal")
     
     def add_transaction(self, transaction_type):
+        if not self.ensure_loaded():
+            return
         dialog = EnhancedTransactionDialog(self.root, transaction_type)
         self.root.wait_window(dialog.top)
         
         if dialog.result:
+            # The dialog validated the amount (in halalas)
             amount, from_account, to_account, description = dialog.result
             
-            # Validate amount
-            try:
-                amount = float(amount)
-                if amount <= 0:
-                    messagebox.showerror("Error", "Amount must be greater than zero")
-                    return
-            except ValueError:
-                messagebox.showerror("Error", "Amount must be a number")
-                return
-            
             # Create transaction
             transaction = {
                 "date": datetime.now().strftime("%Y-%m-%d"),
@@ -495,189 +588,545 @@ class ModernTransactionApp:
                 "description": description
             }
             
-            # Add transaction to list and update balance
-            self.transactions.append(transaction)
+            if transaction_type == "Withdrawal" and amount > self.ledger.aggregates.balance:
+                messagebox.showerror("Error", "Insufficient balance for withdrawal")
+                return
+            if not self.ledger.aggregates.accepts(None, transaction):
+                messagebox.showerror("Error", "Amount is too large: the balance could not be stored")
+                return
             
-            if transaction_type == "Deposit":
-                self.balance += amount
-            else:
-                if amount > self.balance:
-                    messagebox.showerror("Error", "Insufficient balance for withdrawal")
-                    self.transactions.pop()
-                    return
-                self.balance -= amount
+            # Add transaction to the ledger (which updates the balance)
+            self.ledger.add(transaction)
             
             # Save data and update display
-            self.save_data()
-            self.update_display()
+            self.save_data("add", transaction)
+            self.refresh_display()
             messagebox.showinfo("Success", f"{transaction_type} completed successfully")
     
-    def calculate_running_balance(self):
-        """Calculate running balance for each transaction"""
-        running_balance = 0
-        balances = []
-        
-        for transaction in self.transactions:
-            if transaction["type"] == "Deposit":
-                running_balance += transaction["amount"]
-            else:
-                running_balance -= transaction["amount"]
-            balances.append(running_balance)
+    def import_statement(self):
+        """Add the transactions of a CSV or OFX statement (or a JSON backup) in the
+        import worker; they are saved and displayed once at the end"""
+        if not self.ensure_loaded():
+            return
+        file_path = filedialog.askopenfilename(
+            title="Import Statement",
+            filetypes=[("Bank statements", "*.csv *.ofx *.qfx"), ("JSON backups", "*.json"), ("All files", "*.*")])
+        if not file_path:
+            return
         
-        return balances
+        self.importing = True
+        self.import_added = 0
+        self.import_cancel.clear()
+        self.load_status_var.set("Importing transactions...")
+        self.load_progress_bar['mode'] = 'indeterminate'
+        self.load_progress_bar.start(20)
+        self.import_cancel_button.pack(side=tk.RIGHT, padx=(10, 0))
+        self.load_progress_bar.pack(side=tk.RIGHT)
+        self.load_status_label.pack(side=tk.RIGHT, padx=10)
+        
+        count = len(self.ledger)
+        future = self.import_future = self.import_executor.submit(
+            import_file, self.ledger, file_path, progress=self.set_import_progress,
+            cancelled=self.import_cancel.is_set)
+        future.add_done_callback(
+            lambda future: self.root.after(0, self.finish_import, future, file_path, count))
+        self.root.after(100, self.update_import_progress)
     
-    def calculate_account_balance(self, account_name):
-        """Calculate balance for a specific account based on all transactions"""
-        total_balance = 0
+    def set_import_progress(self, added):
+        # Called from the import worker; read by update_import_progress
+        self.import_added = added
+    
+    def update_import_progress(self):
+        """Show the number of rows added until the import finishes"""
+        if not self.importing:
+            return
+        if self.import_cancel.is_set():
+            self.load_status_var.set("Cancelling import...")
+        elif self.import_added:
+            self.load_status_var.set(f"Importing transactions... {self.import_added:,} added")
+        self.root.after(100, self.update_import_progress)
+    
+    def cancel_import(self):
+        """Stop the running import after the batch being added"""
+        self.import_cancel.set()
+    
+    def finish_import(self, future, file_path, count):
+        """Save and display the imported transactions, on the Tk thread"""
+        self.importing = False
+        self.load_progress_bar.stop()
+        self.load_progress_bar['mode'] = 'determinate'
+        self.import_cancel_button.pack_forget()
+        self.load_progress_bar.pack_forget()
+        self.load_status_label.pack_forget()
+        try:
+            result = future.result()
+        except (OSError, ValueError, ArithmeticError) as e:
+            result = None
+            messagebox.showerror("Error", f"Could not import {file_path}: {e}")
         
-        for transaction in self.transactions:
-            # Calculate deposits made by the account (credit)
-            if transaction["type"] == "Deposit" and transaction.get("from_account") == account_name:
-                total_balance += transaction["amount"]
-            
-            # Calculate withdrawals made to the account (debit)
-            if transaction["type"] == "Withdrawal" and transaction.get("to_account") == account_name:
-                total_balance -= transaction["amount"]
+        # Batches added before a read error or a cancellation stay in the ledger
+        if len(self.ledger) != count:
+            self.save_data()
+            self.refresh_display()
+        if result is None:
+            return
         
-        return total_balance
+        message = f"Imported {result.added} transactions"
+        if result.cancelled:
+            message += " (cancelled before the end of the file)"
+        if result.failed:
+            lines = [f"Row {error.row}: {error.message}" for error in result.errors[:10]]
+            if result.failed > len(lines):
+                lines.append(f"... and {result.failed - len(lines)} more")
+            message += f"\n\nRows skipped ({result.failed}):\n" + "\n".join(lines)
+            messagebox.showwarning("Import", message)
+        else:
+            messagebox.showinfo("Import", message)
+    
+    def export_view(self):
+        """Write the displayed transactions (with the active filters) to a CSV, JSON Lines, HTML or JSON file"""
+        if not self.ensure_loaded():
+            return
+        if not self.display_data:
+            messagebox.showinfo("Export", "There are no transactions to export")
+            return
+        file_path = filedialog.asksaveasfilename(
+            title="Export", defaultextension=".csv",
+            filetypes=[(name, "*" + suffix) for name, suffix in EXPORT_FORMATS])
+        if not file_path:
+            return
+        
+        # The worker reads a copy, so the ledger can be edited meanwhile
+        store = self.ledger.transactions.copy()
+        if isinstance(self.display_data, TransactionView):
+            transactions = TransactionView(store, self.display_data.positions)
+        else:
+            transactions = store
+        future = self.export_executor.submit(export_transactions, transactions, file_path, self.describe_view())
+        future.add_done_callback(
+            lambda future: self.root.after(0, self.finish_export, future, file_path, len(transactions)))
+    
+    def finish_export(self, future, file_path, count):
+        try:
+            future.result()
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not export to {file_path}: {e}")
+            return
+        messagebox.showinfo("Export", f"Exported {count} transactions to {file_path}")
+    
+    def describe_view(self):
+        """The filters of the displayed transactions, in words"""
+        query = self.display_query
+        parts = []
+        if query is not None and query.text:
+            parts.append(f'Search: "{query.text}"')
+        if query is not None and (query.from_date or query.to_date):
+            parts.append(f"Dates: {query.from_date or '...'} to {query.to_date or '...'}")
+        if query is not None and query.transaction_type:
+            parts.append(f"{query.transaction_type}s only")
+        if not parts:
+            parts.append("All transactions")
+        parts.append(f"Exported {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        return " | ".join(parts)
+    
+    def calculate_running_balance(self):
+        """Running balance for each transaction (maintained incrementally)"""
+        return self.ledger.balances
+    
+    def calculate_account_balance(self, account_name):
+        """Deposits from the account minus withdrawals to it (maintained incrementally).
+        Without an exact match, sums the accounts whose name starts with the text.
+        """
+        accounts = self.ledger.accounts
+        account = accounts.get(account_name)
+        if account is not None:
+            return account.balance
+        return sum(match.balance for match in accounts.prefix(account_name))
+    
+    def show_top_counterparties(self):
+        """Show the accounts with the largest amounts moved"""
+        if not self.ensure_loaded():
+            return
+        dialog = TopCounterpartiesDialog(self.root, self.ledger.accounts.top(20), self.format_currency)
+        self.root.wait_window(dialog.top)
+    
+    def schedule_search(self, *args):
+        """Run the search once typing has paused for SEARCH_DEBOUNCE_MS"""
+        if self.loading:
+            # Searched once the ledger is loaded
+            return
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.quick_search)
     
+    @instrumented("quick_search")
     def quick_search(self, *args):
-        search_term = self.search_var.get().strip()
+        """Run the current query (search term, date range and type) in the search worker"""
+        if self.loading:
+            return
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+            self.search_after_id = None
+        
+        self.cancel_search()
+        query = self.current_query()
         
-        if not search_term:
+        if query.is_empty():
             self.update_display()
             self.search_results_frame.pack_forget()
             return
         
-        results = []
-        for transaction in self.transactions:
-            # Search in sender or receiver name
-            from_match = "from_account" in transaction and search_term.lower() in transaction["from_account"].lower()
-            to_match = "to_account" in transaction and search_term.lower() in transaction["to_account"].lower()
-            desc_match = "description" in transaction and search_term.lower() in transaction["description"].lower()
-            if from_match or to_match or desc_match:
-                results.append(transaction)
-        
-        if results:
-            self.update_display(results)
+        generation = self.search_generation
+        version = self.ledger.version
+        self.search_future = self.search_executor.submit(self.run_search, query)
+        self.search_future.add_done_callback(
+            lambda future: self.root.after(0, self.show_search_results, generation, version, query, future))
+    
+    def cancel_search(self):
+        """Drop the results of any search still queued or running"""
+        self.search_generation += 1
+        if self.search_future is not None:
+            self.search_future.cancel()
+            self.search_future = None
+    
+    @instrumented("search", rows=lambda result: len(result[0]))
+    def run_search(self, query):
+        """Matching transactions and, for a search term, the account's balance (in the search worker, or on the Tk thread after a change)"""
+        # All filters are answered from the ledger's indexes; holding its lock
+        # keeps a change on the Tk thread from landing between the two reads
+        with self.ledger.lock:
+            results = self.ledger.filter(query)
             
             # Calculate account's balance
-            account_balance = self.calculate_account_balance(search_term)
-            
-            self.search_results_frame.pack(fill=tk.X, pady=(0, 15))
-            
+            account_balance = self.calculate_account_balance(query.text) if query.text else None
+        return results, account_balance
+    
+    @instrumented("show_search_results")
+    def show_search_results(self, generation, version, query, future):
+        """Display the results of a finished search, on the Tk thread"""
+        if generation != self.search_generation or future.cancelled():
+            return
+        self.search_future = None
+        
+        # The ledger changed while the worker was reading it: search again
+        if version != self.ledger.version:
+            self.quick_search()
+            return
+        
+        self.show_results(query, *future.result())
+    
+    def show_results(self, query, results, account_balance):
+        """Display the transactions matching ``query`` with a summary line"""
+        self.update_display(results if results else [], query)
+        self.search_results_frame.pack(fill=tk.X, pady=(0, 15))
+        
+        if not results:
+            if query.text:
+                self.search_results_var.set(f"No results found for '{query.text}'")
+            else:
+                self.search_results_var.set("No transactions match the selected filters")
+        elif query.text:
             # Show balance
             self.search_results_var.set(
-                f"Search results for '{search_term}': "
+                f"Search results for '{query.text}': "
                 f"Found {len(results)} transactions | "
                 f"Balance: {self.format_currency(account_balance)} SAR"
             )
         else:
-            self.update_display([])
-            self.search_results_frame.pack(fill=tk.X, pady=(0, 15))
-            self.search_results_var.set(f"No results found for '{search_term}'")
+            self.search_results_var.set(f"Filter results: Found {len(results)} transactions")
     
     def on_item_double_click(self, event):
-        selected = self.tree.selection()
-        if selected:
-            item = self.tree.item(selected[0])
-            values = item["values"]
-            
-            # Correct order of values according to displayed columns
-            date = values[0]
-            deposit = values[1]
-            from_account = values[2]
-            withdrawal = values[3]
-            to_account = values[4]
-            description = values[5]
-            balance = values[6]
-            
-            transaction_type = "Deposit" if deposit != "0.00" else "Withdrawal"
-            amount = deposit if deposit != "0.00" else withdrawal
-            
-            details = (f"Date: {date}\n"
-                      f"Type: {transaction_type}\n"
-                      f"Amount: {amount} SAR\n"
-                      f"From: {from_account}\n"
-                      f"To: {to_account}\n"
-                      f"Description: {description}\n"
-                      f"Balance after transaction: {balance} SAR")
-            
-            messagebox.showinfo("Transaction Details", details)
+        """Show the details of the double-clicked transaction, read from the ledger by id"""
+        transaction = self.get_selected_transaction()
+        index = self.table.selected_index()
+        if transaction is None or index is None:
+            return
+        
+        # Balance of the row as displayed (counting only the filtered transactions)
+        balance = self.display_balances[self.display_index(index)]
+        
+        details = (f"Date: {transaction['date']}\n"
+                  f"Type: {transaction['type']}\n"
+                  f"Amount: {self.format_currency(transaction['amount'])} SAR\n"
+                  f"From: {transaction.get('from_account', 'Not specified')}\n"
+                  f"To: {transaction.get('to_account', 'Not specified')}\n"
+                  f"Description: {transaction['description']}\n"
+                  f"Balance after transaction: {self.format_currency(balance)} SAR")
+        
+        messagebox.showinfo("Transaction Details", details)
     
-    def update_display(self, transactions=None):
-        # Clear current table
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+    @instrumented("sort")
+    def sort_by_column(self, column):
+        """Sort the table by a column; clicking the same heading again reverses the order"""
+        if not self.ensure_loaded():
+            return
+        count_rows(len(self.display_data))
+        if column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        
+        for name, text in self.headings.items():
+            if name == self.sort_column:
+                text += " ▼" if self.sort_descending else " ▲"
+            self.tree.heading(name, text=text)
         
+        # Only the order of the rows changes: swap it in and redraw the viewport
+        self.sort_display()
+        self.table.set_row_count(len(self.display_data), reset=True)
+    
+    def sort_display(self):
+        """Order of the displayed rows for the active sort column"""
+        if self.sort_column is None or not self.display_data:
+            self.display_order = None
+        else:
+            view = self.display_data if self.display_filtered else None
+            self.display_order = self.ledger.sort_order(self.sort_column, view)
+    
+    def display_index(self, index):
+        """Index into display_data of the row shown at ``index``"""
+        order = self.display_order
+        if order is None:
+            return index
+        if self.sort_descending:
+            return order[len(order) - 1 - index]
+        return order[index]
+    
+    def build_row(self, index):
+        """Build the (key, values, tags) of a table row from the displayed data"""
+        index = self.display_index(index)
+        transaction = self.display_data[index]
+        tag = 'deposit' if transaction['type'] == 'Deposit' else 'withdrawal'
+        
+        # Determine deposit and withdrawal values
+        deposit_value = self.format_currency(transaction['amount']) if transaction['type'] == 'Deposit' else "0.00"
+        withdrawal_value = self.format_currency(transaction['amount']) if transaction['type'] == 'Withdrawal' else "0.00"
+        
+        balance_value = self.format_currency(self.display_balances[index])
+        
+        # Values in correct column order
+        values = (
+            transaction["date"],
+            deposit_value,
+            transaction.get("from_account", "Not specified"),
+            withdrawal_value,
+            transaction.get("to_account", "Not specified"),
+            transaction["description"],
+            balance_value
+        )
+        return transaction["id"], values, (tag,)
+    
+    @instrumented("update_display")
+    def update_display(self, transactions=None, query=None):
         # Display transactions (or specified transactions in case of search)
-        display_data = transactions if transactions is not None else self.transactions
+        display_data = transactions if transactions is not None else self.ledger
+        count_rows(len(display_data))
+        
+        # A different list means a new view: start again from the top,
+        # unless it holds new results of the query already displayed
+        new_view = display_data is not self.display_data and (query is None or query != self.display_query)
+        self.display_query = query
+        self.display_data = display_data
+        self.display_filtered = transactions is not None
+        
+        if not self.display_filtered:
+            self.display_balances = self.calculate_running_balance()
+        else:
+            # In case of search, calculate balance based on displayed transactions only
+            self.display_balances = self.ledger.view_balances(display_data)
+        self.sort_display()
         
         if display_data:
             self.no_results_label.pack_forget()
             self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
             
-            # Calculate running balance
-            running_balances = self.calculate_running_balance()
-            
-            for i, transaction in enumerate(display_data):
-                tag = 'deposit' if transaction['type'] == 'Deposit' else 'withdrawal'
-                
-                # Determine deposit and withdrawal values
-                deposit_value = self.format_currency(transaction['amount']) if transaction['type'] == 'Deposit' else "0.00"
-                withdrawal_value = self.format_currency(transaction['amount']) if transaction['type'] == 'Withdrawal' else "0.00"
-                
-                # Use appropriate running balance
-                if transactions is None:
-                    balance_value = self.format_currency(running_balances[i])
-                else:
-                    # In case of search, calculate balance based on displayed transactions only
-                    temp_balance = 0
-                    for j in range(i + 1):
-                        if display_data[j]["type"] == "Deposit":
-                            temp_balance += display_data[j]["amount"]
-                        else:
-                            temp_balance -= display_data[j]["amount"]
-                    balance_value = self.format_currency(temp_balance)
-                
-                # Insert values in correct column order
-                self.tree.insert("", "end", values=(
-                    transaction["date"],
-                    deposit_value,
-                    transaction.get("from_account", "Not specified"),
-                    withdrawal_value,
-                    transaction.get("to_account", "Not specified"),
-                    transaction["description"],
-                    balance_value
-                ), tags=(tag,))
+            # Only the rows in the viewport are materialized
+            self.table.set_row_count(len(display_data), reset=new_view)
         else:
+            self.table.set_row_count(0, reset=True)
             self.tree.pack_forget()
             self.no_results_label.pack(expand=True)
         
         # Update current balance
-        self.balance_var.set(f"{self.format_currency(self.balance)} SAR")
+        aggregates = self.ledger.aggregates
+        self.balance_var.set(f"{self.format_currency(aggregates.balance)} SAR")
         
         # Update statistics
         if transactions is None:
-            total_deposits = sum(t['amount'] for t in self.transactions if t['type'] == 'Deposit')
-            total_withdrawals = sum(t['amount'] for t in self.transactions if t['type'] == 'Withdrawal')
-            
-            display_count = len(self.transactions)
-            self.stats_var.set(f"Showing {display_count} transactions | "
-                              f"Total Deposits: {self.format_currency(total_deposits)} SAR | "
-                              f"Total Withdrawals: {self.format_currency(total_withdrawals)} SAR")
+            self.stats_var.set(f"Showing {aggregates.count} transactions | "
+                              f"Total Deposits: {self.format_currency(aggregates.total_deposits)} SAR | "
+                              f"Total Withdrawals: {self.format_currency(aggregates.total_withdrawals)} SAR")
         else:
             self.stats_var.set(f"Showing {len(display_data)} transactions from search results")
     
     def load_data(self):
-        self.transactions = load_transactions()
-        # Calculate current balance from transactions
-        self.balance = 0.0
-        for transaction in self.transactions:
-            if transaction["type"] == "Deposit":
-                self.balance += transaction["amount"]
+        """Show the snapshot summary right away and read the ledger in the background"""
+        self.loading = True
+        self.load_progress = 0.0
+        
+        preview = load_summary()
+        if preview is not None:
+            self.show_preview(*preview)
+        else:
+            self.table.set_row_count(0, reset=True)
+            self.balance_var.set("")
+            self.stats_var.set("")
+        
+        self.load_status_var.set("Loading transactions...")
+        self.load_progress_bar['value'] = 0
+        self.load_progress_bar.pack(side=tk.RIGHT)
+        self.load_status_label.pack(side=tk.RIGHT, padx=10)
+        
+        self.load_future = self.load_executor.submit(self.read_ledger)
+        self.load_future.add_done_callback(
+            lambda future: self.root.after(0, self.finish_loading, future))
+        self.root.after(100, self.update_load_progress)
+    
+    @instrumented("load_ledger", rows=lambda result: len(result[0]))
+    def read_ledger(self):
+        """Loading worker: a new ledger with its indexes, and whether ids were assigned"""
+        transactions = load_transactions(progress=self.set_load_progress)
+        self.set_load_progress(1.0)
+        ledger = Ledger()
+        migrated = ledger.load(transactions)
+        return ledger, migrated
+    
+    def set_load_progress(self, fraction):
+        # Called from the loading worker; read by update_load_progress
+        self.load_progress = fraction
+    
+    def update_load_progress(self):
+        """Refresh the progress bar until loading finishes"""
+        if not self.loading:
+            return
+        if self.load_progress < 1.0:
+            self.load_progress_bar['value'] = self.load_progress * 100
+        elif str(self.load_progress_bar['mode']) != 'indeterminate':
+            # Indexing (the long phase of a snapshot load) reports no fraction:
+            # the bar keeps moving instead of sitting at 100%
+            self.load_status_var.set("Indexing transactions...")
+            self.load_progress_bar['mode'] = 'indeterminate'
+            self.load_progress_bar.start(20)
+        self.root.after(100, self.update_load_progress)
+    
+    def finish_loading(self, future):
+        """Switch to the loaded ledger, on the Tk thread"""
+        self.load_progress_bar.stop()
+        self.load_progress_bar['mode'] = 'determinate'
+        try:
+            ledger, migrated = future.result()
+        except Exception as e:
+            # Editing stays disabled: saving now could overwrite the data
+            self.load_status_var.set("Could not load transactions")
+            messagebox.showerror("Error", f"Could not load transactions: {e}")
+            return
+        
+        self.ledger = ledger
+        self.loading = False
+        self.load_progress_bar.pack_forget()
+        self.load_status_label.pack_forget()
+        
+        # Legacy files get their transaction ids written back once, JSON data
+        # is converted to a binary snapshot, and changes journaled in a
+        # previous session are folded into a snapshot
+        if migrated or journal_size() or needs_snapshot():
+            self.save_data()
+        
+        self.update_display()
+        if not self.current_query().is_empty():
+            self.quick_search()
+    
+    def show_preview(self, summary, recent):
+        """Display the latest transactions and the totals of the snapshot header"""
+        # Running balances counted back from the final balance
+        balances = []
+        balance = summary.balance
+        for transaction in reversed(recent):
+            balances.append(balance)
+            balance -= signed_amount(transaction)
+        balances.reverse()
+        
+        self.display_data = recent
+        self.display_filtered = True
+        self.display_balances = balances
+        self.display_order = None
+        if recent:
+            self.table.set_row_count(len(recent), reset=True)
+        
+        self.balance_var.set(f"{self.format_currency(summary.balance)} SAR")
+        self.stats_var.set(f"Showing the latest {len(recent)} of {summary.count} transactions | "
+                          f"Total Deposits: {self.format_currency(summary.total_deposits)} SAR | "
+                          f"Total Withdrawals: {self.format_currency(summary.total_withdrawals)} SAR")
+    
+    def ensure_loaded(self):
+        """True once the whole ledger is loaded and no import is running; otherwise tell the user to wait"""
+        if self.loading:
+            messagebox.showinfo("Loading", "Transactions are still loading, please try again in a moment.")
+            return False
+        if self.importing:
+            messagebox.showinfo("Importing", "A statement is being imported, please try again in a moment.")
+            return False
+        return True
+    
+    def save_data(self, operation=None, transaction=None, previous=None):
+        """Queue a change for the background saver, or a full snapshot when
+        compaction is due or the last save failed"""
+        if operation and self.saver.error is None and not needs_compaction(self.pending_changes):
+            self.saver.save_change(operation, transaction, previous)
+            self.pending_changes += 1
+        else:
+            # A copy, so the worker writes a consistent ledger while editing goes on
+            self.saver.save_snapshot(self.ledger.transactions.copy())
+            self.pending_changes = 0
+        
+        if self.save_after_id is None:
+            self.save_after_id = self.root.after(100, self.check_saving)
+    
+    def check_saving(self):
+        """Poll the background saver and report when saving fails or recovers"""
+        pending = self.saver.pending
+        error = self.saver.error
+        if error is not self.save_error:
+            if error is None:
+                self.save_status_label.pack_forget()
             else:
-                self.balance -= transaction["amount"]
+                self.save_status_var.set("Changes not saved")
+                self.save_status_label.pack(side=tk.RIGHT, padx=10)
+                if self.save_error is None:
+                    messagebox.showerror("Error", f"Could not save your changes: {error}\n\n"
+                                         "They are kept and will be saved again with your next change.")
+            self.save_error = error
+        
+        if pending:
+            self.save_after_id = self.root.after(100, self.check_saving)
+        else:
+            self.save_after_id = None
     
-    def save_data(self):
-        save_transactions(self.transactions, self.balance)
\ No newline at end of file
+    def on_close(self):
+        """Finish writing queued changes before the window closes, waiting at most
+        CLOSE_TIMEOUT_S for each attempt, then stop the workers"""
+        if self.importing:
+            # Keep the batches already added: stop the import, then save them
+            self.import_cancel.set()
+            wait([self.import_future], CLOSE_TIMEOUT_S)
+            if self.import_future.done():
+                self.importing = False
+                self.save_data()
+        
+        saved = self.saver.flush(CLOSE_TIMEOUT_S)
+        if not saved and not self.loading and not self.importing:
+            # Try once more with a full snapshot of the ledger in memory
+            self.save_data()
+            saved = self.saver.flush(CLOSE_TIMEOUT_S)
+        if not saved:
+            reason = self.saver.error or f"saving did not finish within {CLOSE_TIMEOUT_S} seconds"
+            if not messagebox.askyesno("Unsaved Changes",
+                                       f"Could not save your changes: {reason}\n\nQuit anyway?"):
+                return
+        
+        for executor in (self.search_executor, self.load_executor, self.export_executor, self.import_executor):
+            executor.shutdown(wait=False, cancel_futures=True)
+        # A write that is stuck is left to the saver's daemon thread
+        self.saver.close(CLOSE_TIMEOUT_S if saved else 0)
+        self.root.destroy()
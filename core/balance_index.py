@@ -0,0 +1,76 @@
+from array import array
+from itertools import accumulate
+from typing import Dict, Iterable
+
+from core.analytics import ENGINE, np
+
+
+def signed_amount(transaction: Dict) -> int:
+    """Amount with its effect on the balance (deposits add, withdrawals subtract)"""
+    if transaction["type"] == "Deposit":
+        return transaction["amount"]
+    return -transaction["amount"]
+
+
+def prefix_sums(transactions: Iterable[Dict]) -> array:
+    """Running balance of a view, counting only the given transactions"""
+    return array('q', accumulate(signed_amount(t) for t in transactions))
+
+
+class RunningBalanceIndex:
+    """Balance right after each transaction (``index[i]``), patched on every change"""
+
+    def __init__(self, transactions: Iterable[Dict] = ()):
+        self._balances = array('q')
+        self.rebuild(transactions)
+
+    def rebuild(self, transactions: Iterable[Dict]):
+        """Recompute the whole index from a list of transactions"""
+        self._balances = prefix_sums(transactions)
+
+    def set_balances(self, balances: array):
+        """Use running balances computed elsewhere (e.g. by the analytics engine)"""
+        self._balances = balances
+
+    def append(self, transaction: Dict):
+        """Account for a transaction added at the end of the ledger"""
+        self._balances.append(self.total + signed_amount(transaction))
+
+    def update(self, index: int, transaction: Dict):
+        """Account for the new amount of the transaction at ``index``"""
+        delta = signed_amount(transaction) - self._amount_at(index)
+        if delta:
+            self._shift(index, delta)
+
+    def delete(self, index: int):
+        """Account for the removal of the transaction at ``index``"""
+        delta = -self._amount_at(index)
+        del self._balances[index]
+        self._shift(index, delta)
+
+    @property
+    def total(self) -> int:
+        """Balance after the last transaction"""
+        return self._balances[-1] if self._balances else 0
+
+    def _amount_at(self, index: int) -> int:
+        previous = self._balances[index - 1] if index > 0 else 0
+        return self._balances[index] - previous
+
+    def _shift(self, start: int, delta: int):
+        balances = self._balances
+        if ENGINE == "numpy" and start < len(balances):
+            # In place on the array's buffer, without a Python-level loop
+            np.frombuffer(balances, dtype=np.int64)[start:] += delta
+            return
+        for i in range(start, len(balances)):
+            balances[i] += delta
+
+    def __getitem__(self, index: int) -> int:
+        return self._balances[index]
+
+    def __len__(self) -> int:
+        return len(self._balances)
+
+    def __iter__(self):
+        return iter(self._balances)
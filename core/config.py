@@ -1,9 +1,72 @@
+import os
 from pathlib import Path
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-TRANSACTIONS_FILE = BASE_DIR / "core" / "data" / "transactions.json"
-PASSCODE_FILE = BASE_DIR / "core" / "data" / "passcode.json"
+# Where the data files are kept (another folder can be used, e.g. for benchmarks)
+DATA_DIR = Path(os.environ.get("PAS_DATA_DIR") or BASE_DIR / "core" / "data")
+
+TRANSACTIONS_FILE = DATA_DIR / "transactions.json"
+SNAPSHOT_FILE = DATA_DIR / "transactions.bin"
+JOURNAL_FILE = DATA_DIR / "transactions.journal"
+PASSCODE_FILE = DATA_DIR / "passcode.json"
 APP_ICON = BASE_DIR / "assets" / "icons" / "app.ico"
 APP_TITLE = "Personal Account Statement"
+
+# Engine for balances, totals and filters: "auto" (NumPy when installed) or "python"
+ANALYTICS_ENGINE = os.environ.get("PAS_ANALYTICS_ENGINE", "auto")
+
+# When saved data is forced to disk with fsync: "always" (snapshots and each
+# batch of journaled changes), "snapshot" (snapshots only) or "never"
+FSYNC_POLICIES = ("always", "snapshot", "never")
+FSYNC_POLICY = os.environ.get("PAS_FSYNC_POLICY", "always")
+if FSYNC_POLICY not in FSYNC_POLICIES:
+    print(f"Unknown PAS_FSYNC_POLICY {FSYNC_POLICY!r} (expected one of {', '.join(FSYNC_POLICIES)}), "
+          "using \"always\"")
+    FSYNC_POLICY = "always"
+
+# Time the background saver waits for more changes before writing (milliseconds)
+SAVE_COALESCE_MS = 200
+
+# Seconds the window waits for pending saves (and a running import to stop) when it closes
+CLOSE_TIMEOUT_S = 10
+
+# Number of journaled changes after which the journal is folded into a new snapshot
+JOURNAL_COMPACT_THRESHOLD = 500
+
+# Latest transactions kept in the snapshot header and shown while the ledger loads
+STARTUP_PAGE_SIZE = 200
+
+# Recent query results kept for reuse: at most this many queries and positions in total
+QUERY_CACHE_SIZE = 32
+QUERY_CACHE_ROWS = 1_000_000
+
+# Rows of an imported statement added to the ledger at a time
+IMPORT_BATCH_SIZE = 20_000
+
+# Rows of an imported statement sorted by date in memory; longer statements
+# are sorted in runs of this size kept in temporary files, then merged
+IMPORT_SORT_ROWS = 50_000
+
+# Statements at least this large are split into chunks of about
+# IMPORT_CHUNK_BYTES parsed by a pool of processes; smaller ones are parsed
+# in the app's process, as starting the pool would cost more than it saves
+IMPORT_PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+IMPORT_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Date formats accepted in imported statements, besides ISO "YYYY-MM-DD"
+IMPORT_DATE_FORMATS = ("%d/%m/%Y", "%Y/%m/%d", "%d-%m-%Y", "%d.%m.%Y", "%Y%m%d")
+
+# Rejected rows of an import that are reported individually
+IMPORT_MAX_ERRORS = 1000
+
+# Idle time after the last keystroke before quick search runs (milliseconds)
+SEARCH_DEBOUNCE_MS = 250
+
+# Timing of the app's hot paths (see utils/instrumentation.py): on at startup
+# with PAS_INSTRUMENT=1, or from the Tools menu; the latest runs are kept and
+# runs slower than SLOW_OPERATION_MS are logged
+INSTRUMENT = os.environ.get("PAS_INSTRUMENT", "0") == "1"
+INSTRUMENT_HISTORY = 500
+SLOW_OPERATION_MS = 200
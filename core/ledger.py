@@ -0,0 +1,231 @@
+import threading
+from array import array
+from typing import Collection, Dict, Iterable, Iterator, Optional, Sequence
+
+from core.accounts import AccountLedger
+from core.aggregates import BALANCE_TOO_LARGE, LedgerAggregates
+from core.analytics import AnalyticsEngine
+from core.balance_index import RunningBalanceIndex, prefix_sums
+from core.query import Query, QueryEngine
+from core.search_index import SearchIndex
+from core.sort_index import SortIndex, argsort
+from core.transaction_store import TransactionRow, TransactionStore, TransactionView
+from utils.date_filter import DateIndex, DateLike
+
+
+class Ledger:
+    """Transactions in ledger order, indexed by their stable id.
+
+    Every transaction carries an integer ``"id"`` that never changes, so the
+    UI can refer to a row without matching on its date, amount or text.
+
+    Transactions are kept in a columnar TransactionStore: reading the ledger
+    gives TransactionRow views, while mutations return plain dict copies.
+    """
+
+    def __init__(self, transactions: Iterable[Dict] = ()):
+        self.transactions = TransactionStore()
+        self.analytics = AnalyticsEngine(self.transactions)
+        self.balances = RunningBalanceIndex()
+        self.aggregates = LedgerAggregates()
+        self.accounts = AccountLedger()
+        self.search_index = SearchIndex()
+        self.date_index = DateIndex()
+        self.sort_index = SortIndex(self.transactions)
+        self.queries = QueryEngine(self)
+        self._next_id = 1
+        # Incremented once a change has reached the store and every index,
+        # so readers can detect stale results
+        self.version = 0
+        # Held by changes and by filters, which may run in a worker thread
+        self.lock = threading.RLock()
+        self.load(transactions)
+
+    def load(self, transactions: Iterable[Dict]) -> bool:
+        """Replace the ledger content. Returns True if ids had to be assigned.
+        A TransactionStore (as read from a binary snapshot) is used as it is.
+        """
+        with self.lock:
+            migrated = False
+            if isinstance(transactions, TransactionStore):
+                # Strings stay encoded in the snapshot's bytes until read
+                self.transactions = transactions
+                self._next_id = 1 + max(transactions.ids, default=0)
+            else:
+                transactions = list(transactions)
+                self._next_id = 1 + max((t["id"] for t in transactions
+                                         if isinstance(t.get("id"), int)), default=0)
+
+                seen = set()
+                for transaction in transactions:
+                    # Legacy files have no ids; duplicates are renumbered as well
+                    if not isinstance(transaction.get("id"), int) or transaction["id"] in seen:
+                        transaction["id"] = self._new_id()
+                        migrated = True
+                    seen.add(transaction["id"])
+                self.transactions = TransactionStore(transactions)
+
+            self.analytics = AnalyticsEngine(self.transactions)
+            self.balances.set_balances(self.analytics.running_balances())
+            self.aggregates.set_totals(*self.analytics.totals())
+            self.sort_index.rebuild(self.transactions)
+            # The remaining indexes read the store's columns, without a dict per row
+            for index in (self.accounts, self.search_index, self.date_index):
+                index.rebuild_from_store(self.transactions)
+            self.version += 1
+            return migrated
+
+    def get(self, transaction_id: int) -> Optional[TransactionRow]:
+        """Transaction with the given id, or None"""
+        try:
+            return self.transactions.row(self.transactions.locate(transaction_id))
+        except KeyError:
+            return None
+
+    def add(self, transaction: Dict) -> int:
+        """Append a transaction, assigning it a new id
+
+        Raises:
+            ValueError: if the balance would no longer fit in 64 bits
+        """
+        with self.lock:
+            if not self.aggregates.accepts(None, transaction):
+                raise ValueError(BALANCE_TOO_LARGE)
+            transaction["id"] = self._new_id()
+            self.transactions.append(transaction)
+            self.balances.append(transaction)
+            self.aggregates.add(transaction)
+            self.accounts.add(transaction)
+            self.search_index.add(transaction)
+            self.date_index.add(transaction)
+            self.sort_index.add(len(self.transactions) - 1)
+            self.version += 1
+            return transaction["id"]
+
+    def extend(self, transactions: Iterable[Dict]) -> int:
+        """Append many transactions, assigning them new ids. Returns how many were added.
+        Indexes that cost an insertion per row are updated once for the whole batch.
+
+        Raises:
+            ValueError: if the balance would no longer fit in 64 bits; the
+                transactions before the one refused are kept
+        """
+        with self.lock:
+            start = len(self.transactions)
+            added = []
+            try:
+                for transaction in transactions:
+                    if not self.aggregates.accepts(None, transaction):
+                        raise ValueError(BALANCE_TOO_LARGE)
+                    transaction["id"] = self._new_id()
+                    self.transactions.append(transaction)
+                    self.balances.append(transaction)
+                    self.aggregates.add(transaction)
+                    self.accounts.add(transaction)
+                    self.search_index.add(transaction)
+                    added.append(transaction)
+            finally:
+                # Rows appended before an error are indexed like the others
+                self.date_index.extend(added)
+                self.sort_index.extend(start)
+                self.version += 1
+            return len(added)
+
+    def update(self, transaction_id: int, **fields) -> Dict:
+        """Change fields of a transaction and return its new content
+
+        Raises:
+            ValueError: if the balance would no longer fit in 64 bits
+        """
+        with self.lock:
+            index = self.transactions.locate(transaction_id)
+            old = self.transactions.to_dict(index)
+            if not self.aggregates.accepts(old, {**old, **fields}):
+                raise ValueError(BALANCE_TOO_LARGE)
+            self.transactions.update(index, fields)
+            transaction = self.transactions.to_dict(index)
+            self.balances.update(index, transaction)
+            self.aggregates.update(old, transaction)
+            self.accounts.update(old, transaction)
+            self.search_index.update(old, transaction)
+            if "date" in fields:
+                self.date_index.remove(old)
+                self.date_index.add(transaction)
+            self.sort_index.update(index)
+            self.version += 1
+            return transaction
+
+    def delete(self, transaction_id: int) -> Dict:
+        """Remove a transaction and return its content"""
+        with self.lock:
+            index = self.transactions.locate(transaction_id)
+            transaction = self.transactions.to_dict(index)
+            self.transactions.delete(index)
+            self.balances.delete(index)
+            self.aggregates.remove(transaction)
+            self.accounts.remove(transaction)
+            self.search_index.remove(transaction)
+            self.date_index.remove(transaction)
+            self.sort_index.delete(index)
+            self.version += 1
+            return transaction
+
+    def filter(self, query: Query) -> TransactionView:
+        """Transactions matching all the filters of ``query``, in ledger order.
+        Raises ValueError for an invalid date.
+        """
+        with self.lock:
+            return self.queries.filter(query)
+
+    def search(self, term: str) -> TransactionView:
+        """Transactions whose accounts or description contain ``term``, in ledger order"""
+        return self.filter(Query(text=term))
+
+    def filter_by_date(self, from_date: DateLike, to_date: DateLike) -> TransactionView:
+        """Transactions dated within the range (inclusive), in ledger order.
+        Raises ValueError for an invalid date.
+        """
+        return self.filter(Query(from_date=from_date, to_date=to_date))
+
+    def select(self, ids: Collection[int]) -> TransactionView:
+        """Transactions with the given ids, in ledger order"""
+        store = self.transactions
+        if len(ids) * 8 > len(store):
+            # A large share of the ledger: one pass is cheaper than sorting
+            positions = array('q', (i for i, t in enumerate(store.ids) if t in ids))
+        else:
+            positions = array('q', sorted(map(store.locate, ids)))
+        return TransactionView(store, positions)
+
+    def sort_order(self, column: str, view: Optional[TransactionView] = None) -> Sequence[int]:
+        """Indexes into ``view`` (the whole ledger by default) ordered by a table column,
+        ascending; rows with equal values stay in ledger order
+        """
+        sort_index = self.sort_index
+        if view is None:
+            if column == "balance":
+                return sort_index.balance_order(self.analytics.running_balances)
+            return sort_index.order(column)
+        if column == "balance":
+            return argsort(self.view_balances(view))
+        return sort_index.view_order(column, view.positions)
+
+    def view_balances(self, transactions: Iterable[Dict]) -> Sequence[int]:
+        """Running balance of a filtered view, counting only its transactions"""
+        if isinstance(transactions, TransactionView) and transactions.store is self.transactions:
+            return self.analytics.running_balances(transactions.positions)
+        return prefix_sums(transactions)
+
+    def _new_id(self) -> int:
+        transaction_id = self._next_id
+        self._next_id += 1
+        return transaction_id
+
+    def __getitem__(self, index: int) -> TransactionRow:
+        return self.transactions[index]
+
+    def __len__(self) -> int:
+        return len(self.transactions)
+
+    def __iter__(self) -> Iterator[TransactionRow]:
+        return iter(self.transactions)
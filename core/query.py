@@ -0,0 +1,252 @@
+from array import array
+from collections import OrderedDict
+from itertools import compress
+from operator import and_, not_, or_
+from datetime import date
+from typing import Dict, NamedTuple, Optional, Set
+
+from core.config import QUERY_CACHE_ROWS, QUERY_CACHE_SIZE
+from core.search_index import normalize_text
+from core.transaction_store import TransactionView
+from utils.date_filter import DateLike, parse_date
+
+
+class _TermMatches(dict):
+    """Whether the pooled string with a given code contains ``term``, computed on first use"""
+
+    def __init__(self, term: str, normalized: Dict[int, str], decode):
+        super().__init__()
+        self.term = term
+        # Shared cache of normalized strings by code
+        self.normalized = normalized
+        self.decode = decode
+
+    def __missing__(self, code: int) -> bool:
+        text = self.normalized.get(code)
+        if text is None:
+            text = self.normalized[code] = normalize_text(self.decode(code))
+        found = self[code] = self.term in text
+        return found
+
+
+def _compress_false(positions, flags):
+    """Positions whose flag is false (the complement of ``compress``)"""
+    return compress(positions, map(not_, flags))
+
+
+class Query(NamedTuple):
+    """Filters combined with AND; a filter left empty matches every transaction.
+
+    A date range may be open on either side. Queries are immutable and
+    hashable, so they can be used as cache keys.
+    """
+    text: str = ""
+    from_date: Optional[DateLike] = None
+    to_date: Optional[DateLike] = None
+    transaction_type: Optional[str] = None  # "Deposit" or "Withdrawal"
+
+    def is_empty(self) -> bool:
+        return (not normalize_text(self.text.strip()) and self.from_date is None
+                and self.to_date is None and self.transaction_type is None)
+
+    def date_span(self):
+        """(start, end) day ordinals of the date range, or None without one.
+
+        Raises:
+            ValueError: if a date is invalid
+        """
+        if self.from_date is None and self.to_date is None:
+            return None
+        start = parse_date(self.from_date).toordinal() if self.from_date is not None else date.min.toordinal()
+        end = parse_date(self.to_date).toordinal() if self.to_date is not None else date.max.toordinal()
+        return start, end
+
+
+class QueryEngine:
+    """Runs Queries against the indexes of a Ledger.
+
+    Every filter can be answered by an index: the trigram search index for
+    text, the date index for a range and the type counts kept by the
+    aggregates. The engine reads the size of each candidate set (cheap for
+    dates and types), starts from the smallest one and checks the other
+    filters on those rows only, against the store's columns.
+
+    Results of recent queries are kept in an LRU cache. A query that narrows
+    a cached one (a longer search term, a shorter date range, an added type
+    filter) is answered by filtering the cached rows, so typing "gro",
+    "groc", "groce" costs the size of the previous result each time, not the
+    size of the ledger. Any change to the ledger empties the cache.
+    """
+
+    def __init__(self, ledger, max_queries: int = QUERY_CACHE_SIZE, max_rows: int = QUERY_CACHE_ROWS):
+        self.ledger = ledger
+        self.max_queries = max_queries
+        self.max_rows = max_rows
+        # Positions by query key (term, date span, deposit), least recently used first
+        self._results: "OrderedDict[tuple, array]" = OrderedDict()
+        self._cached_rows = 0
+        # Index lookups of the current ledger version
+        self._lookups: Dict[tuple, object] = {}
+        self._version = None
+        # Normalized text of the store's pooled strings, by code
+        self._store = None
+        self._normalized: Dict[int, str] = {}
+
+    def filter(self, query: Query) -> TransactionView:
+        """Transactions matching ``query``, in ledger order
+
+        Raises:
+            ValueError: if a date of the query is invalid
+        """
+        ledger = self.ledger
+        store = ledger.transactions
+        if self._version != ledger.version:
+            self.clear()
+            self._version = ledger.version
+        if self._store is not store:
+            self._store = store
+            self._normalized = {}
+
+        key = (normalize_text(query.text.strip()), query.date_span(),
+               None if query.transaction_type is None else query.transaction_type == "Deposit")
+        if key == ("", None, None):
+            return TransactionView(store, array('q', range(len(store))))
+
+        positions = self._results.get(key)
+        if positions is not None:
+            self._results.move_to_end(key)
+            return TransactionView(store, positions)
+
+        base = self._narrowest_cached(key)
+        if base is not None and len(self._results[base]) <= self._index_estimate(key):
+            positions = self._refine(self._results[base], base, key)
+        else:
+            positions = self._lookup(key)
+        self._remember(key, positions)
+        return TransactionView(store, positions)
+
+    def clear(self):
+        """Forget cached results (called when the ledger changes)"""
+        self._results.clear()
+        self._cached_rows = 0
+        self._lookups.clear()
+
+    def _lookup(self, key: tuple) -> array:
+        """Positions matching ``key``, starting from the smallest index candidate set"""
+        ledger = self.ledger
+        store = ledger.transactions
+        term, span, deposit = key
+
+        # Size of the candidate set of each filter
+        sizes = {}
+        text_ids = None
+        if term:
+            text_ids = self._text_ids(term)
+            sizes["text"] = len(text_ids)
+        if span is not None:
+            sizes["date"] = ledger.date_index.count_between(*span)
+        if deposit is not None:
+            sizes["type"] = self._type_count(deposit)
+
+        driver = min(sizes, key=sizes.get)
+        if driver == "text":
+            positions = ledger.select(text_ids).positions
+        elif driver == "date":
+            positions = self._cached_lookup(("date", span), lambda: self._date_positions(*span))
+        else:
+            positions = self._cached_lookup(("type", deposit), lambda: ledger.analytics.type_positions(
+                "Deposit" if deposit else "Withdrawal"))
+
+        # The other filters are checked row by row on the candidates
+        ids, dates, is_deposit = store.ids, store.dates, store.is_deposit
+        checks = []
+        if text_ids is not None and driver != "text":
+            checks.append(lambda p: ids[p] in text_ids)
+        if span is not None and driver != "date":
+            start, end = span
+            checks.append(lambda p: start <= dates[p] <= end)
+        if deposit is not None and driver != "type":
+            checks.append(lambda p: is_deposit(p) == deposit)
+        if checks:
+            positions = array('q', (p for p in positions if all(check(p) for check in checks)))
+        return positions
+
+    def _refine(self, positions: array, base: tuple, key: tuple) -> array:
+        """Filter the cached ``positions`` of ``base`` down to those matching ``key``"""
+        store = self.ledger.transactions
+        term, span, deposit = key
+        # Each filter is a chain of C-level map/compress steps over the positions
+        if term != base[0]:
+            # Whether each pooled string contains the term, decided once per string
+            matches = _TermMatches(term, self._normalized, store.strings.decode)
+            found = None
+            for column in (store.from_accounts, store.to_accounts, store.descriptions):
+                in_column = map(matches.__getitem__, map(column.__getitem__, positions))
+                found = in_column if found is None else map(or_, found, in_column)
+            positions = array('q', compress(positions, found))
+        if span != base[1]:
+            start, end = span
+            dates = store.dates
+            in_span = map(and_, map(start.__le__, map(dates.__getitem__, positions)),
+                          map(end.__ge__, map(dates.__getitem__, positions)))
+            positions = array('q', compress(positions, in_span))
+        if deposit != base[2]:
+            select = compress if deposit else _compress_false
+            positions = array('q', select(positions, map(store.is_deposit, positions)))
+        return positions
+
+    def _narrowest_cached(self, key: tuple) -> Optional[tuple]:
+        """The cached query with the fewest results whose results include those of ``key``"""
+        term, span, deposit = key
+        best = None
+        for cached, positions in self._results.items():
+            cached_term, cached_span, cached_deposit = cached
+            if (cached_term in term
+                    and (cached_span is None or (span is not None and cached_span[0] <= span[0]
+                                                 and span[1] <= cached_span[1]))
+                    and (cached_deposit is None or cached_deposit == deposit)
+                    and (best is None or len(positions) < len(self._results[best]))):
+                best = cached
+        return best
+
+    def _index_estimate(self, key: tuple) -> int:
+        """Candidates the index lookup would start from, at most; a search term
+        counts the transactions holding its rarest trigram"""
+        term, span, deposit = key
+        sizes = [len(self.ledger)]
+        if term:
+            text_ids = self._lookups.get(("text", term))
+            sizes.append(len(text_ids) if text_ids is not None else self.ledger.search_index.estimate(term))
+        if span is not None:
+            sizes.append(self.ledger.date_index.count_between(*span))
+        if deposit is not None:
+            sizes.append(self._type_count(deposit))
+        return min(sizes)
+
+    def _remember(self, key: tuple, positions: array):
+        if len(positions) > self.max_rows:
+            return
+        self._results[key] = positions
+        self._cached_rows += len(positions)
+        while len(self._results) > self.max_queries or self._cached_rows > self.max_rows:
+            _, evicted = self._results.popitem(last=False)
+            self._cached_rows -= len(evicted)
+
+    def _type_count(self, deposit: bool) -> int:
+        aggregates = self.ledger.aggregates
+        return aggregates.deposit_count if deposit else aggregates.withdrawal_count
+
+    def _text_ids(self, term: str) -> Set[int]:
+        return self._cached_lookup(("text", term), lambda: self.ledger.search_index.search(term))
+
+    def _date_positions(self, start: int, end: int) -> array:
+        ledger = self.ledger
+        if ledger.analytics.vectorized:
+            return ledger.analytics.date_positions(start, end)
+        return ledger.select(ledger.date_index.ids_between(start, end)).positions
+
+    def _cached_lookup(self, key: tuple, compute):
+        result = self._lookups.get(key)
+        if result is None:
+            result = self._lookups[key] = compute()
+        return result
@@ -0,0 +1,127 @@
+from array import array
+from typing import Dict, Iterable, Set
+
+SEARCH_FIELDS = ("from_account", "to_account", "description")
+GRAM_SIZE = 3
+
+
+def normalize_text(text: str) -> str:
+    """Case-insensitive form used for indexing and matching"""
+    return text.casefold()
+
+
+def grams(text: str) -> Set[str]:
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class SearchIndex:
+    """Trigram inverted index for substring search over account names and descriptions.
+
+    Field values are normalized once and indexed by distinct value: accounts
+    and descriptions repeat a lot, so the trigrams grow with the vocabulary
+    rather than with the number of transactions. The ids of the transactions
+    holding each value are kept in a compact array, 4 bytes per id.
+    """
+
+    def __init__(self, transactions: Iterable[Dict] = ()):
+        self._rows: Dict[str, array] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self.rebuild(transactions)
+
+    def rebuild(self, transactions: Iterable[Dict]):
+        self._rows = {}
+        self._grams = {}
+        for transaction in transactions:
+            self.add(transaction)
+
+    def rebuild_from_store(self, store):
+        """Index every row of a TransactionStore from its columns: each pooled
+        string is decoded and normalized once, however many rows hold it"""
+        self._rows = {}
+        self._grams = {}
+        strings = store.strings
+        normalized = [None] * len(strings)
+        for transaction_id, *codes in zip(store.ids, store.from_accounts, store.to_accounts, store.descriptions):
+            values = set()
+            for code in codes:
+                value = normalized[code]
+                if value is None:
+                    value = normalized[code] = normalize_text(strings.decode(code))
+                values.add(value)
+            values.discard("")
+            for value in values:
+                rows = self._rows.get(value)
+                if rows is None:
+                    rows = self._rows[value] = array('I')
+                rows.append(transaction_id)
+        for value in self._rows:
+            for gram in grams(value):
+                self._grams.setdefault(gram, set()).add(value)
+
+    def add(self, transaction: Dict):
+        """Index a new transaction"""
+        for value in self._field_values(transaction):
+            rows = self._rows.get(value)
+            if rows is None:
+                rows = self._rows[value] = array('I')
+                for gram in grams(value):
+                    self._grams.setdefault(gram, set()).add(value)
+            rows.append(transaction["id"])
+
+    def remove(self, transaction: Dict):
+        """Drop a transaction from the index"""
+        for value in self._field_values(transaction):
+            rows = self._rows.get(value)
+            if rows is None:
+                continue
+            try:
+                rows.remove(transaction["id"])
+            except ValueError:
+                continue
+            if not rows:
+                del self._rows[value]
+                for gram in grams(value):
+                    values = self._grams[gram]
+                    values.discard(value)
+                    if not values:
+                        del self._grams[gram]
+
+    def update(self, old: Dict, new: Dict):
+        """Re-index a transaction whose text fields may have changed"""
+        self.remove(old)
+        self.add(new)
+
+    def search(self, term: str) -> Set[int]:
+        """Ids of the transactions where ``term`` appears in any search field"""
+        needle = normalize_text(term)
+        if not needle:
+            return set().union(*self._rows.values())
+
+        if len(needle) < GRAM_SIZE:
+            candidates = self._rows.keys()
+        else:
+            postings = sorted((self._grams.get(gram, ()) for gram in grams(needle)), key=len)
+            candidates = set(postings[0])
+            for values in postings[1:]:
+                if not candidates:
+                    break
+                candidates &= values
+
+        ids = set()
+        for value in candidates:
+            if needle in value:
+                ids.update(self._rows[value])
+        return ids
+
+    def estimate(self, term: str) -> int:
+        """Upper bound on the number of matches of ``term``, from its rarest trigram
+        (the whole vocabulary for a term shorter than a trigram)"""
+        needle = normalize_text(term)
+        if len(needle) < GRAM_SIZE:
+            return sum(map(len, self._rows.values()))
+        rows = self._rows
+        return min(sum(len(rows[value]) for value in self._grams.get(gram, ())) for gram in grams(needle))
+
+    @staticmethod
+    def _field_values(transaction: Dict) -> Set[str]:
+        return {normalize_text(transaction.get(field) or "") for field in SEARCH_FIELDS} - {""}
@@ -0,0 +1,159 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from core.analytics import ENGINE, _to_array, np
+from core.search_index import normalize_text
+from core.transaction_store import TEXT_FIELDS, TransactionStore
+
+# Table columns the index can order by (besides "balance", see SortIndex)
+SORT_COLUMNS = ("date", "deposit", "withdrawal") + TEXT_FIELDS
+
+Keys = Union[array, List[str]]
+
+# Rows appended at once that are inserted into the orders one by one;
+# each insertion moves the tail of every order, so more take a rebuild
+BULK_INSERT_LIMIT = 16
+
+
+class SortIndex:
+    """Row positions of a TransactionStore ordered by a column, built on first use.
+
+    Orders are patched on change instead of sorted again: O(n) per edit or
+    delete (finding and shifting entries), O(log n) plus a move per append.
+    The balance order is recomputed after any change.
+    """
+
+    def __init__(self, store: Optional[TransactionStore] = None):
+        self.rebuild(store if store is not None else TransactionStore())
+
+    def rebuild(self, store: TransactionStore):
+        self.store = store
+        # column -> (positions ordered by key, the key of each of them)
+        self._orders: Dict[str, Tuple[array, Keys]] = {}
+        self._balance_order: Optional[array] = None
+        self._balance_changes = -1
+
+    def order(self, column: str) -> array:
+        """Positions of all rows, ordered by ``column``.
+        The array is kept up to date as the store changes.
+        """
+        entry = self._orders.get(column)
+        if entry is None:
+            entry = self._orders[column] = self._build(column)
+        return entry[0]
+
+    def balance_order(self, running_balances: Callable[[], Sequence[int]]) -> array:
+        """Positions of all rows ordered by their running balance"""
+        if self._balance_order is None or self._balance_changes != self.store.changes:
+            self._balance_order = argsort(running_balances())
+            self._balance_changes = self.store.changes
+        return self._balance_order
+
+    def view_order(self, column: str, positions: Sequence[int]) -> array:
+        """Indexes into ``positions`` (rows in ledger order) ordered by ``column``"""
+        count = len(positions)
+        if count * 16 < len(self.store):
+            # A small view: sorting its own keys beats a pass over the whole order
+            keys = [self._key(column, p) for p in positions]
+            return array('q', sorted(range(count), key=keys.__getitem__))
+
+        # Keep the rows of the view from the full order, as indexes into the view
+        order = self.order(column)
+        if ENGINE == "numpy" and count:
+            inverse = np.full(len(self.store), -1, dtype=np.int64)
+            inverse[np.asarray(positions, dtype=np.int64)] = np.arange(count, dtype=np.int64)
+            indexes = inverse[np.frombuffer(order, dtype=np.int64)]
+            return _to_array(indexes[indexes >= 0])
+        inverse = array('q', [-1]) * len(self.store)
+        for index, position in enumerate(positions):
+            inverse[position] = index
+        return array('q', filter((0).__le__, map(inverse.__getitem__, order)))
+
+    def add(self, position: int):
+        """Index the row just appended at ``position``"""
+        for column, (positions, keys) in self._orders.items():
+            self._insert(positions, keys, self._key(column, position), position)
+
+    def extend(self, start: int):
+        """Index the rows appended from ``start``. Beyond a few rows, the orders
+        are dropped instead and built again when next needed."""
+        if len(self.store) - start > BULK_INSERT_LIMIT:
+            self._orders.clear()
+            return
+        for position in range(start, len(self.store)):
+            self.add(position)
+
+    def update(self, position: int):
+        """Re-index the row at ``position`` after its fields changed"""
+        for column, (positions, keys) in self._orders.items():
+            index = positions.index(position)
+            del positions[index]
+            del keys[index]
+            self._insert(positions, keys, self._key(column, position), position)
+
+    def delete(self, position: int):
+        """Drop the row that was at ``position``; the rows after it move up by one"""
+        for positions, keys in self._orders.values():
+            index = positions.index(position)
+            del positions[index]
+            del keys[index]
+            if ENGINE == "numpy" and len(positions):
+                values = np.frombuffer(positions, dtype=np.int64)
+                values[values > position] -= 1
+                del values
+            else:
+                for i, p in enumerate(positions):
+                    if p > position:
+                        positions[i] = p - 1
+
+    @staticmethod
+    def _insert(positions: array, keys: Keys, key, position: int):
+        # Among equal keys, rows stay in ledger order
+        low, high = bisect_left(keys, key), bisect_right(keys, key)
+        index = bisect_left(positions, position, low, high)
+        positions.insert(index, position)
+        keys.insert(index, key)
+
+    def _key(self, column: str, position: int):
+        store = self.store
+        if column == "date":
+            # Day ordinals; dates that are not ISO (stored negative) sort first
+            return store.dates[position]
+        if column in TEXT_FIELDS:
+            return normalize_text(store.value(position, column))
+        deposit = store.is_deposit(position)
+        if deposit == (column == "deposit"):
+            return store.amounts[position]
+        return 0
+
+    def _build(self, column: str) -> Tuple[array, Keys]:
+        store = self.store
+        count = len(store)
+        if column in TEXT_FIELDS:
+            # Sort the distinct strings once; rows are then ordered by the rank of theirs
+            codes = store._text_column(column)
+            pool = store.strings
+            texts = [normalize_text(pool.decode(code)) for code in range(len(pool))]
+            ranks = [0] * len(texts)
+            rank, previous = -1, None
+            for code in sorted(range(len(texts)), key=texts.__getitem__):
+                if texts[code] != previous:
+                    rank, previous = rank + 1, texts[code]
+                ranks[code] = rank
+            positions = argsort([ranks[code] for code in codes])
+            return positions, [texts[codes[p]] for p in positions]
+
+        if column == "date":
+            values = store.dates
+        else:
+            values = array('q', (self._key(column, p) for p in range(count)))
+        positions = argsort(values)
+        return positions, array('q', map(values.__getitem__, positions))
+
+
+def argsort(values: Sequence[int]) -> array:
+    """Positions that order ``values``; equal values keep their order"""
+    if ENGINE == "numpy" and len(values):
+        return _to_array(np.argsort(np.asarray(values, dtype=np.int64), kind="stable"))
+    return array('q', sorted(range(len(values)), key=values.__getitem__))
@@ -0,0 +1,401 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from datetime import date
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.date_filter import date_ordinal
+
+# Fields stored in columns; any other key of a transaction is kept aside
+FIELDS = ("id", "date", "type", "amount", "from_account", "to_account", "description")
+TEXT_FIELDS = ("from_account", "to_account", "description")
+
+# Date strings by ordinal; a ledger only ever spans a few thousand days
+_date_text: Dict[int, str] = {}
+
+
+def _date_to_text(ordinal: int) -> str:
+    text = _date_text.get(ordinal)
+    if text is None:
+        text = _date_text[ordinal] = date.fromordinal(ordinal).isoformat()
+    return text
+
+
+class StringPool:
+    """Dictionary encoding of repeated strings: each distinct value is stored once.
+
+    A pool read from a snapshot keeps the UTF-8 bytes and decodes strings
+    when they are read; the lookup table for new values is built on the
+    first ``encode``. Values that are edited away stay in the pool until
+    the ledger is reloaded.
+    """
+
+    def __init__(self):
+        self._values: List[str] = []
+        self._codes: Optional[Dict[str, int]] = {}
+        # Encoded strings and the offset of each in ``_blob`` (snapshot pools)
+        self._blob = b""
+        self._offsets: Optional[Sequence[int]] = None
+
+    @classmethod
+    def from_blob(cls, blob: bytes, offsets: Sequence[int]) -> "StringPool":
+        """Pool over UTF-8 strings stored back to back; ``offsets`` has one more entry than strings"""
+        pool = cls()
+        pool._blob = blob
+        pool._offsets = offsets
+        pool._codes = None
+        return pool
+
+    def to_blob(self) -> Tuple[bytes, Sequence[int]]:
+        """The strings as UTF-8 bytes and their offsets, as taken by ``from_blob``"""
+        if self._offsets is not None:
+            return self._blob, self._offsets
+        encoded = [value.encode("utf-8") for value in self._values]
+        offsets = array('q', [0])
+        offsets.extend(accumulate(map(len, encoded)))
+        return b"".join(encoded), offsets
+
+    def copy(self) -> "StringPool":
+        if self._codes is None:
+            # The bytes of a snapshot pool are never modified, only replaced
+            return StringPool.from_blob(self._blob, self._offsets)
+        pool = StringPool()
+        pool._values = list(self._values)
+        pool._codes = dict(self._codes)
+        return pool
+
+    def encode(self, value: str) -> int:
+        if self._codes is None:
+            self.decode_all()
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+        return code
+
+    def decode(self, code: int) -> str:
+        if self._offsets is not None:
+            return str(self._blob[self._offsets[code]:self._offsets[code + 1]], "utf-8")
+        return self._values[code]
+
+    def decode_all(self):
+        """Decode every string now, e.g. before reading the whole store"""
+        if self._codes is not None:
+            return
+        self._values = [self.decode(code) for code in range(len(self))]
+        self._codes = {value: code for code, value in enumerate(self._values)}
+        self._blob, self._offsets = b"", None
+
+    def __len__(self) -> int:
+        if self._offsets is not None:
+            return len(self._offsets) - 1
+        return len(self._values)
+
+
+class TransactionRow(Mapping):
+    """Read-only dict-like view of one transaction of a TransactionStore.
+
+    The view refers to the transaction by id, so it stays valid when rows
+    before it are deleted. ``dict(row)`` gives an independent copy.
+    """
+
+    __slots__ = ("_store", "_id", "_hint")
+
+    def __init__(self, store: "TransactionStore", transaction_id: int, position: int = 0):
+        self._store = store
+        self._id = transaction_id
+        # Where the row was when the view was made, checked before searching
+        self._hint = position
+
+    def __getitem__(self, key: str):
+        position = self._store.locate(self._id, self._hint)
+        self._hint = position
+        return self._store.value(position, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.keys(self._id))
+
+    def __len__(self) -> int:
+        return len(self._store.keys(self._id))
+
+    def to_dict(self) -> Dict:
+        position = self._store.locate(self._id, self._hint)
+        return self._store.to_dict(position)
+
+    def __repr__(self) -> str:
+        return f"TransactionRow({self.to_dict()!r})"
+
+
+class TransactionView(Sequence):
+    """Rows of a TransactionStore at the given positions, e.g. a filter result.
+
+    Positions are a snapshot: take a new view after the store changes.
+    """
+
+    __slots__ = ("store", "positions")
+
+    def __init__(self, store: "TransactionStore", positions: array):
+        self.store = store
+        self.positions = positions
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TransactionView(self.store, self.positions[index])
+        return self.store.row(self.positions[index])
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+
+class TransactionStore:
+    """Transactions in ledger order, stored by column instead of as dicts.
+
+    Ids and amounts are 64-bit arrays, dates are day ordinals, the type is a
+    single bit per row (set for deposits) and account names and descriptions
+    are codes into a shared StringPool. A row costs a few dozen bytes instead
+    of a dict with its own keys and strings.
+
+    Rows are read back as TransactionRow views, or copied with ``to_dict``.
+    ``changes`` counts modifications, for caches built from the columns.
+    """
+
+    def __init__(self, transactions: Iterable[Dict] = ()):
+        self.changes = 0
+        self.clear()
+        for transaction in transactions:
+            self.append(transaction)
+
+    @classmethod
+    def from_columns(cls, ids: array, amounts: array, dates: array, deposits: bytearray,
+                     from_accounts: array, to_accounts: array, descriptions: array,
+                     strings: StringPool, extras: Optional[Dict[int, Dict]] = None,
+                     ids_sorted: bool = True) -> "TransactionStore":
+        """Store over columns read back from a snapshot"""
+        store = cls()
+        store.ids, store.amounts, store.dates, store.deposits = ids, amounts, dates, deposits
+        store.from_accounts, store.to_accounts, store.descriptions = from_accounts, to_accounts, descriptions
+        store.strings = strings
+        store.extras = extras or {}
+        if not ids_sorted:
+            store._positions = {t: i for i, t in enumerate(ids)}
+        return store
+
+    def normalize_dates(self):
+        """Store as ordinals the valid dates that earlier versions pooled as strings"""
+        dates = self.dates
+        if not dates or min(dates) >= 0:
+            return
+        for position, code in enumerate(dates):
+            if code < 0:
+                dates[position] = self._encode_date(self._decode_date(code))
+
+    def copy(self) -> "TransactionStore":
+        """Independent copy, e.g. to be written by another thread while this one changes"""
+        store = TransactionStore.from_columns(
+            self.ids[:], self.amounts[:], self.dates[:], bytearray(self.deposits),
+            self.from_accounts[:], self.to_accounts[:], self.descriptions[:], self.strings.copy(),
+            {k: dict(v) for k, v in self.extras.items()})
+        store._positions = None if self._positions is None else dict(self._positions)
+        return store
+
+    def clear(self):
+        self.ids = array('q')
+        self.amounts = array('q')
+        # Day ordinals; a string that is not a valid date is pooled as -(code + 1)
+        self.dates = array('i')
+        self.deposits = bytearray()
+        self.from_accounts = array('i')
+        self.to_accounts = array('i')
+        self.descriptions = array('i')
+        self.strings = StringPool()
+        # Keys beyond FIELDS, by transaction id
+        self.extras: Dict[int, Dict] = {}
+        # Ids are kept in increasing order so a position is found by bisection;
+        # only files with out-of-order ids need this map instead
+        self._positions: Optional[Dict[int, int]] = None
+        self.changes += 1
+
+    def append(self, transaction: Dict):
+        """Add a transaction (which must have an id) at the end.
+
+        Every value is converted before any column changes, so a transaction
+        that cannot be stored (e.g. OverflowError for an amount beyond 64 bits)
+        leaves the store as it was.
+        """
+        transaction_id = transaction["id"]
+        # Array items of one row, checked for type and range by array itself
+        numbers = array('q', (transaction_id, transaction["amount"]))
+        codes = array('i', (
+            self._encode_date(transaction["date"]),
+            self.strings.encode(transaction.get("from_account") or ""),
+            self.strings.encode(transaction.get("to_account") or ""),
+            self.strings.encode(transaction.get("description") or ""),
+        ))
+        deposit = transaction["type"] == "Deposit"
+
+        self.changes += 1
+        if self._positions is None and self.ids and transaction_id <= self.ids[-1]:
+            self._positions = {t: i for i, t in enumerate(self.ids)}
+        if self._positions is not None:
+            self._positions[transaction_id] = len(self.ids)
+
+        position = len(self.ids)
+        self.ids.append(numbers[0])
+        self.amounts.append(numbers[1])
+        self.dates.append(codes[0])
+        if position % 8 == 0:
+            self.deposits.append(0)
+        self._set_deposit(position, deposit)
+        self.from_accounts.append(codes[1])
+        self.to_accounts.append(codes[2])
+        self.descriptions.append(codes[3])
+
+        extras = {key: value for key, value in transaction.items() if key not in FIELDS}
+        if extras:
+            self.extras[transaction_id] = extras
+
+    def update(self, position: int, fields: Dict):
+        """Change fields of the transaction at ``position``"""
+        self.changes += 1
+        for key, value in fields.items():
+            if key == "amount":
+                self.amounts[position] = value
+            elif key == "date":
+                self.dates[position] = self._encode_date(value)
+            elif key == "type":
+                self._set_deposit(position, value == "Deposit")
+            elif key in TEXT_FIELDS:
+                self._text_column(key)[position] = self.strings.encode(value or "")
+            elif key == "id":
+                raise ValueError("Transaction ids cannot be changed")
+            else:
+                self.extras.setdefault(self.ids[position], {})[key] = value
+
+    def delete(self, position: int):
+        """Remove the transaction at ``position``"""
+        self.changes += 1
+        transaction_id = self.ids[position]
+        for column in (self.ids, self.amounts, self.dates,
+                       self.from_accounts, self.to_accounts, self.descriptions):
+            del column[position]
+        self._delete_bit(position)
+        self.extras.pop(transaction_id, None)
+        if self._positions is not None:
+            del self._positions[transaction_id]
+            for i in range(position, len(self.ids)):
+                self._positions[self.ids[i]] = i
+
+    def locate(self, transaction_id: int, hint: int = 0) -> int:
+        """Position of a transaction, checking ``hint`` first.
+
+        Raises:
+            KeyError: if no transaction has this id
+        """
+        ids = self.ids
+        if hint < len(ids) and ids[hint] == transaction_id:
+            return hint
+        if self._positions is not None:
+            return self._positions[transaction_id]
+        position = bisect_left(ids, transaction_id)
+        if position == len(ids) or ids[position] != transaction_id:
+            raise KeyError(transaction_id)
+        return position
+
+    def row(self, position: int) -> TransactionRow:
+        return TransactionRow(self, self.ids[position], position)
+
+    def value(self, position: int, key: str):
+        """One field of the transaction at ``position``"""
+        if key == "id":
+            return self.ids[position]
+        if key == "amount":
+            return self.amounts[position]
+        if key == "type":
+            return "Deposit" if self.is_deposit(position) else "Withdrawal"
+        if key == "date":
+            return self._decode_date(self.dates[position])
+        if key in TEXT_FIELDS:
+            return self.strings.decode(self._text_column(key)[position])
+        extras = self.extras.get(self.ids[position])
+        if extras is None or key not in extras:
+            raise KeyError(key)
+        return extras[key]
+
+    def to_dict(self, position: int) -> Dict:
+        """Copy of the transaction at ``position`` as a plain dict"""
+        decode = self.strings.decode
+        transaction = {
+            "id": self.ids[position],
+            "date": self._decode_date(self.dates[position]),
+            "type": "Deposit" if self.is_deposit(position) else "Withdrawal",
+            "amount": self.amounts[position],
+            "from_account": decode(self.from_accounts[position]),
+            "to_account": decode(self.to_accounts[position]),
+            "description": decode(self.descriptions[position]),
+        }
+        extras = self.extras.get(transaction["id"])
+        if extras:
+            transaction.update(extras)
+        return transaction
+
+    def iter_dicts(self) -> Iterator[Dict]:
+        """Copies of all transactions, in ledger order"""
+        for position in range(len(self.ids)):
+            yield self.to_dict(position)
+
+    @property
+    def ids_sorted(self) -> bool:
+        """Whether ids increase in ledger order (positions are then found by bisection)"""
+        return self._positions is None
+
+    def keys(self, transaction_id: int) -> tuple:
+        extras = self.extras.get(transaction_id)
+        return FIELDS + tuple(extras) if extras else FIELDS
+
+    def is_deposit(self, position: int) -> bool:
+        return bool(self.deposits[position >> 3] >> (position & 7) & 1)
+
+    def _set_deposit(self, position: int, deposit: bool):
+        if deposit:
+            self.deposits[position >> 3] |= 1 << (position & 7)
+        else:
+            self.deposits[position >> 3] &= ~(1 << (position & 7)) & 0xFF
+
+    def _delete_bit(self, position: int):
+        # Shift the following bits down by one, as a single big-integer operation
+        bits = int.from_bytes(self.deposits, "little")
+        bits = (bits & ((1 << position) - 1)) | ((bits >> (position + 1)) << position)
+        size = (len(self.ids) + 7) // 8
+        self.deposits = bytearray(bits.to_bytes(len(self.deposits), "little")[:size])
+
+    def _text_column(self, key: str) -> array:
+        if key == "from_account":
+            return self.from_accounts
+        if key == "to_account":
+            return self.to_accounts
+        return self.descriptions
+
+    def _encode_date(self, text: str) -> int:
+        # Valid dates in another format are stored (and read back) as "YYYY-MM-DD"
+        ordinal = date_ordinal(text)
+        if ordinal is None:
+            return -(self.strings.encode(str(text)) + 1)
+        return ordinal
+
+    def _decode_date(self, code: int) -> str:
+        if code < 0:
+            return self.strings.decode(-code - 1)
+        return _date_to_text(code)
+
+    def __getitem__(self, position: int) -> TransactionRow:
+        if position < 0:
+            position += len(self.ids)
+        return self.row(position)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[TransactionRow]:
+        for position, transaction_id in enumerate(self.ids):
+            yield TransactionRow(self, transaction_id, position)
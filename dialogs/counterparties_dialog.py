@@ -0,0 +1,53 @@
+import tkinter as tk
+from tkinter import ttk, Frame, Label, Button
+
+class TopCounterpartiesDialog:
+    def __init__(self, parent, accounts, format_currency):
+        self.top = tk.Toplevel(parent)
+        self.top.title("Top Counterparties")
+        self.top.geometry("700x420")
+        self.top.configure(bg='#f0f0f0')
+        self.top.transient(parent)
+        self.top.grab_set()
+
+        # Center the window
+        self.top.update_idletasks()
+        x = parent.winfo_x() + (parent.winfo_width() - self.top.winfo_width()) // 2
+        y = parent.winfo_y() + (parent.winfo_height() - self.top.winfo_height()) // 2
+        self.top.geometry(f"+{x}+{y}")
+
+        # Create UI elements
+        form_frame = Frame(self.top, bg='#f0f0f0', padx=20, pady=20)
+        form_frame.pack(fill=tk.BOTH, expand=True)
+
+        Label(form_frame, text="Accounts with the largest amounts moved", font=("Arial", 12, "bold"),
+              bg='#f0f0f0').pack(pady=(0, 10))
+
+        # Accounts table
+        columns = ("name", "received", "paid", "balance", "count")
+        tree = ttk.Treeview(form_frame, columns=columns, show="headings", height=10)
+        tree.heading("name", text="Account")
+        tree.heading("received", text="Deposits From")
+        tree.heading("paid", text="Withdrawals To")
+        tree.heading("balance", text="Balance")
+        tree.heading("count", text="Transactions")
+        for column in columns:
+            tree.column(column, width=120, anchor=tk.CENTER)
+        tree.column("name", width=180)
+
+        for account in accounts:
+            tree.insert("", "end", values=(
+                account.name,
+                format_currency(account.received),
+                format_currency(account.paid),
+                format_currency(account.balance),
+                account.count
+            ))
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        if not accounts:
+            Label(form_frame, text="No accounts yet", font=("Arial", 11),
+                  bg='#f0f0f0', fg='#7f8c8d').pack(pady=5)
+
+        Button(form_frame, text="Close", command=self.top.destroy, font=("Arial", 12, "bold"),
+              bg="#3f6fde", fg="white", width=10).pack(pady=(15, 0))
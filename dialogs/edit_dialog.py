@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import Frame, Label, Entry, Button, messagebox
 from utils.validation import validate_required_fields, validate_amount
+from utils.money import format_amount
 
 class EditTransactionDialog:
     def __init__(self, parent, transaction):
@@ -34,7 +35,7 @@ class EditTransactionDialog:
         
         self.amount_entry = Entry(amount_frame, font=("Arial", 12), width=30, justify="center")
         self.amount_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        self.amount_entry.insert(0, str(transaction["amount"]))
+        self.amount_entry.insert(0, format_amount(transaction["amount"], grouping=False))
         
         # From/To fields based on transaction type
         if transaction["type"] == "Deposit":
@@ -136,7 +137,7 @@ class EditTransactionDialog:
             messagebox.showerror("Error", "Amount must be a positive number")
             return
         
-        self.result = (amount, from_account, to_account, description)
+        self.result = (amount_value, from_account, to_account, description)
         self.top.destroy()
     
     def cancel(self):
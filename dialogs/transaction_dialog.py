@@ -134,7 +134,7 @@ class EnhancedTransactionDialog:
             messagebox.showerror("Error", "Amount must be a positive number")
             return
         
-        self.result = (amount, from_account, to_account, description)
+        self.result = (amount_value, from_account, to_account, description)
         self.top.destroy()
     
     def cancel(self):
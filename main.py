@@ -1,7 +1,11 @@
+import multiprocessing
 import tkinter as tk
 from core.app import ModernTransactionApp
 
 if __name__ == "__main__":
+    # Statement imports parse large files in worker processes (see utils/importer.py),
+    # which a frozen executable must be able to start
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ModernTransactionApp(root)
     root.mainloop()
\ No newline at end of file
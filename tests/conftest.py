@@ -0,0 +1,32 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The app's configuration reads the data folder on import: point it at a
+# scratch folder so the tests never touch core/data
+_DATA_DIR = tempfile.mkdtemp(prefix="pas-tests-")
+os.environ["PAS_DATA_DIR"] = _DATA_DIR
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def data_files(tmp_path, monkeypatch):
+    """The JSON, snapshot and journal files of file_utils, in a folder of their own"""
+    from utils import file_utils
+    files = {"json": tmp_path / "transactions.json", "snapshot": tmp_path / "transactions.bin",
+             "journal": tmp_path / "transactions.journal"}
+    monkeypatch.setattr(file_utils, "TRANSACTIONS_FILE", files["json"])
+    monkeypatch.setattr(file_utils, "SNAPSHOT_FILE", files["snapshot"])
+    monkeypatch.setattr(file_utils, "JOURNAL_FILE", files["journal"])
+    return files
+
+
+def transaction(date="2024-01-01", type="Deposit", amount=100, from_account="", to_account="",
+                description="test", **fields):
+    return {"date": date, "type": type, "amount": amount, "from_account": from_account,
+            "to_account": to_account, "description": description, **fields}
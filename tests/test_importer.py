@@ -0,0 +1,69 @@
+import io
+
+import pytest
+
+from conftest import transaction
+from core.ledger import Ledger
+from utils.importer import import_transactions, parse_csv, parse_ofx, to_transaction
+
+DECIMAL_COMMA_CSV = """Booking date;Details;Debit;Credit
+03.01.2024;Rent;1.250,00;
+01.01.2024;Salary;;3.000,50
+02.01.2024;Coffee;4,5;
+"""
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240105120000<TRNAMT>1500.00<NAME>Employer<MEMO>Salary &amp; bonus
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240106<TRNAMT>-20.25<NAME>Bakery</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+def test_csv_with_decimal_commas():
+    records = list(parse_csv(io.StringIO(DECIMAL_COMMA_CSV)))
+    assert [row for row, _ in records] == [2, 3, 4]
+    assert all(fields["decimal"] == "," for _, fields in records)
+    transactions = [to_transaction(fields) for _, fields in records]
+    assert [(t["date"], t["type"], t["amount"]) for t in transactions] == [
+        ("2024-01-03", "Withdrawal", 125000), ("2024-01-01", "Deposit", 300050), ("2024-01-02", "Withdrawal", 450)]
+
+
+def test_csv_import_in_date_order_with_rejected_rows():
+    text = DECIMAL_COMMA_CSV + "04.01.2024;Typo;12,50,0;\n05.01.2024;Too much;1.000.000,00;\n"
+    ledger = Ledger()
+    result = import_transactions(ledger, parse_csv(io.StringIO(text)))
+    assert (result.added, result.failed) == (3, 2)
+    assert [error.row for error in result.errors] == [5, 6]
+    assert [t["description"] for t in ledger] == ["Salary", "Coffee", "Rent"]
+    assert ledger.aggregates.balance == 300050 - 450 - 125000
+
+
+def test_csv_rejects_a_decimal_comma_without_semicolons():
+    (_, fields), = parse_csv(io.StringIO("date,amount,description\n2024-01-01,\"12,50\",Lunch\n"))
+    with pytest.raises(ValueError, match="Invalid amount"):
+        to_transaction(fields)
+
+
+def test_csv_needs_date_and_amount_columns():
+    with pytest.raises(ValueError):
+        list(parse_csv(io.StringIO("description,amount\nLunch,5\n")))
+
+
+def test_ofx():
+    records = list(parse_ofx(io.StringIO(OFX)))
+    assert [row for row, _ in records] == [1, 2]
+    deposit, withdrawal = (to_transaction(fields) for _, fields in records)
+    assert deposit == transaction(date="2024-01-05", amount=150000, from_account="Employer",
+                                  description="Salary & bonus")
+    assert withdrawal == transaction(date="2024-01-06", type="Withdrawal", amount=2025, to_account="Bakery",
+                                     description="Bakery")
+
+
+def test_ofx_split_across_reads(monkeypatch):
+    from utils import importer
+    expected = list(parse_ofx(io.StringIO(OFX)))
+    # Tags and values cut at every few characters
+    monkeypatch.setattr(importer, "_OFX_CHUNK_SIZE", 7)
+    assert list(parse_ofx(io.StringIO(OFX))) == expected
@@ -0,0 +1,116 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import transaction
+from core.ledger import Ledger
+from core.query import Query
+
+ACCOUNTS = ["", "Bank", "Cash", "Grocer", "Groceries Ltd", "Épicerie"]
+WORDS = ["rent", "groceries", "Coffee", "salary", "GROCER refund", "café"]
+TERMS = ["", "gro", "GROCER", "ca", "é", "rent", "zz", "x"]
+
+
+def random_transaction(rng):
+    return transaction(date=(date(2024, 1, 1) + timedelta(days=rng.randrange(90))).isoformat(),
+                       type=rng.choice(["Deposit", "Withdrawal"]), amount=rng.randrange(1, 100000),
+                       from_account=rng.choice(ACCOUNTS), to_account=rng.choice(ACCOUNTS),
+                       description=f"{rng.choice(WORDS)} {rng.randrange(20)}")
+
+
+def reference_filter(transactions, query):
+    """Brute-force Query: every transaction checked against every filter"""
+    term = query.text.strip().casefold()
+    return [t for t in transactions
+            if (not term or any(term in t[field].casefold()
+                                for field in ("from_account", "to_account", "description")))
+            and (query.from_date is None or t["date"] >= query.from_date)
+            and (query.to_date is None or t["date"] <= query.to_date)
+            and (query.transaction_type is None or t["type"] == query.transaction_type)]
+
+
+def reference_balances(transactions):
+    balances, balance = [], 0
+    for t in transactions:
+        balance += t["amount"] if t["type"] == "Deposit" else -t["amount"]
+        balances.append(balance)
+    return balances
+
+
+def random_query(rng):
+    start = date(2024, 1, 1) + timedelta(days=rng.randrange(100))
+    return Query(text=rng.choice(TERMS),
+                 from_date=rng.choice([None, start.isoformat()]),
+                 to_date=rng.choice([None, (start + timedelta(days=rng.randrange(40))).isoformat()]),
+                 transaction_type=rng.choice([None, "Deposit", "Withdrawal"]))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_queries_match_brute_force(seed):
+    rng = random.Random(seed)
+    ledger = Ledger([random_transaction(rng) for _ in range(200)])
+    reference = [dict(t) for t in ledger]
+
+    for step in range(300):
+        action = rng.random()
+        if action < 0.3 or not reference:
+            new = random_transaction(rng)
+            ledger.add(new)
+            reference.append(dict(new))
+        elif action < 0.5:
+            position = rng.randrange(len(reference))
+            fields = dict(random_transaction(rng))
+            fields = {key: fields[key] for key in rng.sample(sorted(fields), rng.randrange(1, 4))}
+            reference[position] = ledger.update(reference[position]["id"], **fields)
+        elif action < 0.6:
+            ledger.delete(reference.pop(rng.randrange(len(reference)))["id"])
+        else:
+            query = random_query(rng)
+            expected = reference_filter(reference, query)
+            view = ledger.filter(query)
+            assert [dict(t) for t in view] == expected, (step, query)
+            assert list(ledger.view_balances(view)) == reference_balances(expected)
+
+    assert [dict(t) for t in ledger] == reference
+    assert list(ledger.analytics.running_balances()) == reference_balances(reference)
+    assert ledger.aggregates.balance == sum(t["amount"] if t["type"] == "Deposit" else -t["amount"]
+                                            for t in reference)
+    for t in rng.sample(reference, 10):
+        assert dict(ledger.get(t["id"])) == t
+    assert ledger.get(max(t["id"] for t in reference) + 1) is None
+
+
+def sort_key(t, column):
+    """The value a table column is sorted by: amounts in their own column, text without case"""
+    if column in ("deposit", "withdrawal"):
+        return t["amount"] if t["type"].casefold() == column else 0
+    return t[column].casefold() if column != "date" else t["date"]
+
+
+def test_sort_orders_are_patched_like_a_fresh_sort():
+    rng = random.Random(1)
+    ledger = Ledger([random_transaction(rng) for _ in range(100)])
+    columns = ("date", "deposit", "withdrawal", "from_account", "description")
+    for column in columns:
+        ledger.sort_order(column)
+    ledger.sort_order("balance")
+    for t in list(ledger)[::7]:
+        ledger.update(t["id"], **{k: v for k, v in random_transaction(rng).items() if k in ("date", "amount")})
+    ledger.delete(ledger[10]["id"])
+    ledger.add(random_transaction(rng))
+
+    rows = [dict(t) for t in ledger]
+    for column in columns:
+        # Python's sort is stable, like the ledger's: equal values keep ledger order
+        assert list(ledger.sort_order(column)) == sorted(range(len(rows)), key=lambda i: sort_key(rows[i], column))
+    balances = reference_balances(rows)
+    assert list(ledger.sort_order("balance")) == sorted(range(len(rows)), key=balances.__getitem__)
+
+
+def test_balance_overflow_leaves_the_ledger_unchanged():
+    ledger = Ledger([transaction(amount=9 * 10 ** 18)])
+    with pytest.raises(ValueError):
+        ledger.add(transaction(amount=9 * 10 ** 18))
+    assert len(ledger) == 1
+    assert ledger.aggregates.balance == 9 * 10 ** 18
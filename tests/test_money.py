@@ -0,0 +1,43 @@
+import pytest
+
+from utils.money import MAX_MINOR, format_amount, parse_amount, to_minor
+
+
+@pytest.mark.parametrize("text, minor", [
+    ("12.5", 1250),
+    ("0.005", 1),
+    ("0.004", 0),
+    ("2.675", 268),
+    ("-2.675", -268),
+    (" 7 ", 700),
+    ("1e3", 100000),
+])
+def test_parse_amount_rounds_half_up(text, minor):
+    assert parse_amount(text) == minor
+
+
+@pytest.mark.parametrize("text", ["", "abc", "nan", "inf", "1,5", "1e30"])
+def test_parse_amount_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        parse_amount(text)
+
+
+def test_parse_amount_range():
+    largest = format_amount(MAX_MINOR, grouping=False)
+    assert parse_amount(largest) == MAX_MINOR
+    assert parse_amount("-" + largest) == -MAX_MINOR
+    with pytest.raises(ValueError, match="out of range"):
+        parse_amount(format_amount(MAX_MINOR + 1, grouping=False))
+
+
+def test_to_minor_reads_legacy_floats_exactly():
+    # 0.1 + 0.2 is 0.30000000000000004 as a float
+    assert to_minor(0.1 + 0.2) == 30
+    assert to_minor(1.005) == 101
+    assert to_minor(12) == 1200
+
+
+def test_format_amount():
+    assert format_amount(123456789) == "1,234,567.89"
+    assert format_amount(-5) == "-0.05"
+    assert format_amount(100000, grouping=False) == "1000.00"
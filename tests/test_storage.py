@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from conftest import transaction
+from core.transaction_store import TransactionStore
+from utils.binary_snapshot import read_snapshot, write_snapshot
+from utils.file_utils import (journal_record, load_snapshot, load_transactions, needs_snapshot, read_journal,
+                              replay_journal, save_transactions, write_changes)
+
+TRANSACTIONS = [
+    transaction(id=1, date="2024-01-01", amount=10000, from_account="Salary", description="January pay"),
+    transaction(id=2, date="2024-01-05", type="Withdrawal", amount=2550, to_account="Grocer",
+                description="Groceries – épicerie"),
+    transaction(id=3, date="2024-02-01", amount=1, description="Interest"),
+]
+
+
+def test_binary_snapshot_round_trip(tmp_path):
+    path = tmp_path / "transactions.bin"
+    write_snapshot(TransactionStore(TRANSACTIONS), path, fsync=False)
+    store = read_snapshot(path)
+    assert list(store.iter_dicts()) == TRANSACTIONS
+
+
+def test_snapshot_and_journal_round_trip(data_files):
+    assert save_transactions(TRANSACTIONS)
+    assert not data_files["journal"].exists()
+
+    added = transaction(id=4, date="2024-03-01", amount=500, description="Refund")
+    updated = {**TRANSACTIONS[1], "amount": 2600}
+    write_changes([("add", added, None), ("update", updated, TRANSACTIONS[1]),
+                   ("delete", TRANSACTIONS[0], TRANSACTIONS[0])])
+
+    expected = [updated, TRANSACTIONS[2], added]
+    assert list(load_transactions().iter_dicts()) == expected
+    # Records already in the snapshot are applied again harmlessly
+    save_transactions(expected)
+    write_changes([("add", added, None), ("delete", TRANSACTIONS[0], TRANSACTIONS[0])])
+    assert list(load_transactions().iter_dicts()) == expected
+
+
+def test_incomplete_journal_line_is_ignored(data_files):
+    save_transactions(TRANSACTIONS)
+    write_changes([("delete", TRANSACTIONS[2], TRANSACTIONS[2])])
+    with open(data_files["journal"], "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "transaction": {"id": 9')
+    assert len(read_journal()) == 1
+    assert [t["id"] for t in load_transactions().iter_dicts()] == [1, 2]
+
+
+def test_journal_replayed_over_legacy_json(data_files):
+    # Version 1 files stored amounts as floats in SAR
+    legacy = [{**t, "amount": t["amount"] / 100} for t in TRANSACTIONS]
+    data_files["json"].write_text(json.dumps({"transactions": legacy}), encoding="utf-8")
+    added = transaction(id=4, date="2024-03-01", amount=12.34, description="Refund")
+    with open(data_files["journal"], "w", encoding="utf-8") as f:
+        for record in (journal_record("add", added), journal_record("delete", TRANSACTIONS[0])):
+            f.write(json.dumps(record) + "\n")
+
+    assert needs_snapshot()
+    transactions, legacy_format = load_snapshot(data_files["json"], with_journal=True)
+    assert legacy_format
+    assert [t["amount"] for t in transactions] == [2550, 1, 1234]
+    assert load_transactions() == transactions
+
+
+def test_replay_journal_is_idempotent():
+    records = [journal_record("add", transaction(id=4)), journal_record("update", {**TRANSACTIONS[0], "amount": 5}),
+               journal_record("delete", TRANSACTIONS[1])]
+    once = replay_journal([dict(t) for t in TRANSACTIONS], records)
+    assert replay_journal([dict(t) for t in once], records) == once
+    assert [(t["id"], t["amount"]) for t in once] == [(1, 5), (3, 1), (4, 100)]
+
+
+def test_damaged_json_is_an_error(data_files):
+    data_files["json"].write_text('{"version": 2, "transactions": [{"id": 1', encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_transactions()
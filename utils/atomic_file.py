@@ -0,0 +1,47 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+
+@contextmanager
+def atomic_write(file_path: Path, mode: str = 'w', fsync: bool = True, **kwargs) -> Iterator[IO]:
+    """Write to a temporary file that replaces ``file_path`` once complete.
+
+    Readers (and the app after a crash) see either the old file or the new
+    one, never a partial write. If the block raises, the temporary file is
+    removed and ``file_path`` is left as it was. With ``fsync`` the data and
+    the rename are flushed to disk before returning.
+    """
+    file_path.parent.mkdir(exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    try:
+        with open(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        fsync_directory(file_path.parent)
+
+def fsync_directory(path: Path):
+    """Flush a directory entry (e.g. after a rename) where the platform allows it"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # Directories cannot be opened on Windows, where renames are durable anyway
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,196 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from core.analytics import AnalyticsEngine
+from core.transaction_store import StringPool, TransactionStore
+from utils.atomic_file import atomic_write
+
+# Layout (little-endian): header, then the sections in this order
+#   ids q[count] | amounts q[count] | string offsets q[strings + 1] |
+#   dates i[count] | from accounts i[count] | to accounts i[count] |
+#   descriptions i[count] | deposit bitmap | UTF-8 strings | extras (JSON)
+MAGIC = b"PASSNAP\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIqqqqqqq")
+
+# Header flags
+IDS_SORTED = 1
+
+_SWAP = sys.byteorder != "little"
+
+
+def _column(typecode: str, data) -> array:
+    column = array(typecode)
+    column.frombytes(data)
+    if _SWAP:
+        column.byteswap()
+    return column
+
+def _column_bytes(column: array) -> bytes:
+    if _SWAP:
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+def _sections(count: int, string_count: int, text_size: int, extras_size: int) -> Dict[str, Tuple[int, int]]:
+    """(start, end) of each section of the file"""
+    sizes = (("ids", 8 * count), ("amounts", 8 * count), ("offsets", 8 * (string_count + 1)),
+             ("dates", 4 * count), ("from_accounts", 4 * count), ("to_accounts", 4 * count),
+             ("descriptions", 4 * count), ("deposits", (count + 7) // 8),
+             ("text", text_size), ("extras", extras_size))
+    sections = {}
+    position = HEADER.size
+    for name, size in sizes:
+        sections[name] = (position, position + size)
+        position += size
+    return sections
+
+
+class _Snapshot:
+    """A snapshot file mapped in memory; the OS reads the pages that are accessed"""
+
+    def __init__(self, file_path: Path):
+        self.file = open(file_path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file cannot be mapped
+            self.file.close()
+            raise ValueError(f"{file_path} is not a transactions snapshot")
+        self.view = memoryview(self.map)
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{file_path} is not a transactions snapshot")
+
+        (magic, version, self.flags, self.count, self.string_count, text_size, extras_size,
+         self.total_deposits, self.total_withdrawals, self.deposit_count) = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version > FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{file_path} is not a transactions snapshot (or is from a newer version)")
+        self.sections = _sections(self.count, self.string_count, text_size, extras_size)
+        if self.sections["extras"][1] > len(self.map):
+            self.close()
+            raise ValueError(f"{file_path} is truncated")
+
+    def section(self, name: str) -> memoryview:
+        start, end = self.sections[name]
+        return self.view[start:end]
+
+    def extras(self) -> Dict[int, Dict]:
+        """Keys beyond the stored columns, by transaction id"""
+        section = self.section("extras")
+        try:
+            if not len(section):
+                return {}
+            return {int(k): v for k, v in json.loads(str(section, "utf-8")).items()}
+        finally:
+            section.release()
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_snapshot(store: TransactionStore, file_path: Path, fsync: bool = True):
+    """Write the columns of a store to a binary snapshot, replacing ``file_path`` atomically"""
+    text, offsets = store.strings.to_blob()
+    extras = json.dumps({str(k): v for k, v in store.extras.items()}, ensure_ascii=False).encode("utf-8") \
+        if store.extras else b""
+    total_deposits, total_withdrawals, deposit_count, _ = AnalyticsEngine(store).totals()
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, IDS_SORTED if store.ids_sorted else 0,
+                         len(store), len(offsets) - 1, len(text), len(extras),
+                         total_deposits, total_withdrawals, deposit_count)
+    with atomic_write(file_path, 'wb', fsync=fsync) as f:
+        f.write(header)
+        for column in (store.ids, store.amounts, offsets, store.dates,
+                       store.from_accounts, store.to_accounts, store.descriptions):
+            f.write(_column_bytes(column))
+        f.write(bytes(store.deposits[:(len(store) + 7) // 8]))
+        f.write(text)
+        f.write(extras)
+
+def read_snapshot(file_path: Path) -> TransactionStore:
+    """Load a binary snapshot: the columns are copied as they are, strings decode on use
+
+    Raises:
+        ValueError: if the file is not a valid snapshot
+    """
+    with _Snapshot(file_path) as snapshot:
+        extras = snapshot.extras()
+        sections = {name: snapshot.section(name) for name in
+                    ("ids", "amounts", "offsets", "dates", "from_accounts", "to_accounts",
+                     "descriptions", "deposits", "text")}
+        try:
+            strings = StringPool.from_blob(bytes(sections["text"]), _column('q', sections["offsets"]))
+            store = TransactionStore.from_columns(
+                ids=_column('q', sections["ids"]),
+                amounts=_column('q', sections["amounts"]),
+                dates=_column('i', sections["dates"]),
+                deposits=bytearray(sections["deposits"]),
+                from_accounts=_column('i', sections["from_accounts"]),
+                to_accounts=_column('i', sections["to_accounts"]),
+                descriptions=_column('i', sections["descriptions"]),
+                strings=strings,
+                extras=extras,
+                ids_sorted=bool(snapshot.flags & IDS_SORTED))
+        finally:
+            for section in sections.values():
+                section.release()
+    store.normalize_dates()
+    return store
+
+def read_snapshot_summary(file_path: Path, recent_count: int) -> Tuple[Dict[str, int], List[Dict]]:
+    """Totals from the header and the last ``recent_count`` transactions.
+    Only the pages holding those rows (and their strings) are read from disk.
+
+    Raises:
+        ValueError: if the file is not a valid snapshot
+    """
+    with _Snapshot(file_path) as snapshot:
+        totals = {"total_deposits": snapshot.total_deposits,
+                  "total_withdrawals": snapshot.total_withdrawals,
+                  "deposit_count": snapshot.deposit_count,
+                  "withdrawal_count": snapshot.count - snapshot.deposit_count}
+
+        # Start on a byte of the deposit bitmap; the extra rows before the page are dropped
+        start = max(snapshot.count - recent_count, 0) // 8 * 8
+        views = []
+        try:
+            columns = {}
+            for name, typecode in (("ids", 'q'), ("amounts", 'q'), ("dates", 'i'), ("from_accounts", 'i'),
+                                   ("to_accounts", 'i'), ("descriptions", 'i')):
+                views.append(snapshot.section(name))
+                columns[name] = _column(typecode, views[-1][start * array(typecode).itemsize:])
+            views.append(snapshot.section("deposits"))
+            deposits = bytearray(views[-1][start // 8:])
+
+            views.append(snapshot.section("offsets"))
+            if _SWAP:
+                offsets = _column('q', views[-1])
+            else:
+                views.append(views[-1].cast('q'))
+                offsets = views[-1]
+            views.append(snapshot.section("text"))
+            strings = StringPool.from_blob(views[-1], offsets)
+
+            store = TransactionStore.from_columns(deposits=deposits, strings=strings,
+                                                  extras=snapshot.extras(), **columns)
+            recent = list(store.iter_dicts())[-recent_count:] if recent_count else []
+            del store, strings, offsets
+        finally:
+            for view in reversed(views):
+                view.release()
+    return totals, recent
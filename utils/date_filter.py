@@ -1,33 +1,151 @@
-from datetime import datetime
+from array import array
+from bisect import bisect_left, insort
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Union
 
-def filter_transactions_by_date(transactions_list: list[dict], from_date: str, to_date: str) -> list[dict]:
+DateLike = Union[str, date, datetime]
+
+# Date strings accepted besides the canonical "YYYY-MM-DD" (stored normalised to it)
+DATE_FORMATS = ("%Y-%m-%d", "%Y%m%d")
+
+# Index keys pack the date ordinal and the transaction id into one integer
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+
+
+def parse_date(value: DateLike) -> date:
+    """
+    Convert a date string (see DATE_FORMATS), date or datetime to a date
+
+    Raises:
+        ValueError: if the value is not a valid date
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        text = value.strip()
+        if len(text) == 10 and text[4] == "-" and text[7] == "-":
+            # Canonical dates, much faster than strptime
+            return date.fromisoformat(text)
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, date_format).date()
+            except ValueError:
+                pass
+    raise ValueError(f"Invalid date: {value!r}")
+
+def date_ordinal(value: DateLike) -> Optional[int]:
+    """
+    Day ordinal of a transaction's date, or None if it is not a valid date.
+    The ledger's store and date index both read dates with it, so every
+    analytics engine matches the same transactions.
+    """
+    try:
+        return parse_date(value).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+def filter_transactions_by_date(transactions_list: Iterable[Dict], from_date: DateLike, to_date: DateLike) -> List[Dict]:
     """
     Filter transactions by date range
-    
+
     Args:
         transactions_list: List of transaction dictionaries
-        from_date: Start date in format "YYYY-MM-DD"
-        to_date: End date in format "YYYY-MM-DD"
-    
+        from_date: Start date ("YYYY-MM-DD" string, date or datetime)
+        to_date: End date ("YYYY-MM-DD" string, date or datetime)
+
     Returns:
         Filtered list of transactions within the date range
+
+    Raises:
+        ValueError: if a date is invalid
     """
-    if not transactions_list:
-        return []
-    
-    try:
-        start = datetime.strptime(from_date, "%Y-%m-%d").date()
-        end = datetime.strptime(to_date, "%Y-%m-%d").date()
-        
-        filtered_transactions = []
-        
-        for transaction in transactions_list:
-            transaction_date = datetime.strptime(transaction["date"], "%Y-%m-%d").date()
-            if start <= transaction_date <= end:
-                filtered_transactions.append(transaction)
-        
-        return filtered_transactions
-    
-    except ValueError:
-        # Return empty list if date format is invalid
-        return []
\ No newline at end of file
+    start = parse_date(from_date).toordinal()
+    end = parse_date(to_date).toordinal()
+
+    return [transaction for transaction in transactions_list
+            if start <= (date_ordinal(transaction["date"]) or 0) <= end]
+
+
+class DateIndex:
+    """
+    Transactions ordered by date, for range queries by binary search
+
+    Dates are parsed once when a transaction is indexed. Keys are stored in a
+    compact array sorted by (date, id), so a range query is two bisections
+    and a slice.
+    """
+
+    def __init__(self, transactions: Iterable[Dict] = ()):
+        self._keys = array('q')
+        self.rebuild(transactions)
+
+    def rebuild(self, transactions: Iterable[Dict]):
+        keys = []
+        for transaction in transactions:
+            key = self._key(transaction)
+            if key is not None:
+                keys.append(key)
+        keys.sort()
+        self._keys = array('q', keys)
+
+    def rebuild_from_store(self, store):
+        """Rebuild from the day ordinals of a TransactionStore, parsed when they were stored.
+        Negative codes are text that is not a valid date, left out as in ``_key``."""
+        keys = [(ordinal << _ID_BITS) | transaction_id
+                for ordinal, transaction_id in zip(store.dates, store.ids) if ordinal >= 0]
+        keys.sort()
+        self._keys = array('q', keys)
+
+    def add(self, transaction: Dict):
+        key = self._key(transaction)
+        if key is not None:
+            insort(self._keys, key)
+
+    def extend(self, transactions: Iterable[Dict]):
+        """Index many transactions at once: one merge instead of an insertion each"""
+        keys = sorted(key for key in map(self._key, transactions) if key is not None)
+        if not keys:
+            return
+        if not self._keys or keys[0] >= self._keys[-1]:
+            self._keys.extend(keys)
+        else:
+            # Two sorted runs, merged by a single sort pass
+            self._keys = array('q', sorted(self._keys + array('q', keys)))
+
+    def remove(self, transaction: Dict):
+        key = self._key(transaction)
+        if key is None:
+            return
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+
+    def ids_between(self, start: int, end: int) -> List[int]:
+        """Ids of the transactions dated from ordinal ``start`` to ``end`` (inclusive)"""
+        low, high = self._span(start, end)
+        return [key & _ID_MASK for key in self._keys[low:high]]
+
+    def count_between(self, start: int, end: int) -> int:
+        """Number of transactions dated from ordinal ``start`` to ``end``, in two bisections"""
+        low, high = self._span(start, end)
+        return high - low
+
+    def _span(self, start: int, end: int):
+        if start > end:
+            return 0, 0
+        return (bisect_left(self._keys, start << _ID_BITS),
+                bisect_left(self._keys, (end + 1) << _ID_BITS))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def _key(transaction: Dict):
+        ordinal = date_ordinal(transaction.get("date"))
+        if ordinal is None:
+            # Transactions without a valid date never match a date range
+            return None
+        return (ordinal << _ID_BITS) | transaction["id"]
@@ -0,0 +1,148 @@
+import csv
+import html
+import io
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Tuple
+
+from core.balance_index import signed_amount
+from core.config import APP_TITLE, FSYNC_POLICY
+from core.transaction_store import TransactionRow
+from utils.atomic_file import atomic_write
+from utils.file_utils import export_json
+from utils.money import format_amount
+
+# Columns of a CSV export, which the statement importer reads back
+CSV_HEADING = ("date", "type", "amount", "from_account", "to_account", "description", "balance")
+
+EXPORT_FORMATS = (("CSV", ".csv"), ("JSON Lines", ".jsonl"), ("HTML statement", ".html"), ("JSON backup", ".json"))
+
+_STATEMENT_STYLE = """
+body { font-family: Arial, sans-serif; color: #2c3e50; margin: 2em; }
+h1 { margin-bottom: 0; }
+.subtitle { color: #7f8c8d; margin-top: 0.3em; }
+table { border-collapse: collapse; width: 100%; margin-bottom: 2em; }
+th, td { border-bottom: 1px solid #ddd; padding: 4px 8px; text-align: left; }
+td.amount, th.amount { text-align: right; white-space: nowrap; }
+tfoot td { font-weight: bold; border-top: 2px solid #2c3e50; }
+.deposit { color: #1e8449; }
+.withdrawal { color: #c0392b; }
+@media print {
+  body { margin: 0; }
+  section + section { page-break-before: always; }
+  tr { page-break-inside: avoid; }
+}
+"""
+
+
+def with_balances(transactions: Iterable[Dict]) -> Iterator[Tuple[Dict, int]]:
+    """Each transaction (as a dict) with the running balance of the sequence, as displayed for a view"""
+    balance = 0
+    for transaction in transactions:
+        if isinstance(transaction, TransactionRow):
+            # Read the store's columns once per row, not once per field
+            transaction = transaction.to_dict()
+        balance += signed_amount(transaction)
+        yield transaction, balance
+
+def csv_chunks(transactions: Iterable[Dict]) -> Iterator[str]:
+    """CSV lines of the transactions, amounts in SAR"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CSV_HEADING)
+    for transaction, balance in with_balances(transactions):
+        writer.writerow((transaction["date"], transaction["type"], format_amount(transaction["amount"], grouping=False),
+                         transaction.get("from_account", ""), transaction.get("to_account", ""),
+                         transaction["description"], format_amount(balance, grouping=False)))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def jsonl_chunks(transactions: Iterable[Dict]) -> Iterator[str]:
+    """One JSON object per line: the saved fields (amounts in halalas) and the running balance"""
+    for transaction, balance in with_balances(transactions):
+        record = dict(transaction, balance=balance)
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+def html_chunks(transactions: Iterable[Dict], subtitle: str = "") -> Iterator[str]:
+    """A printable statement: one table per month with its totals and closing balance"""
+    escape = html.escape
+    yield (f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{escape(APP_TITLE)}</title>\n'
+           f'<style>{_STATEMENT_STYLE}</style>\n</head>\n<body>\n<h1>{escape(APP_TITLE)}</h1>\n'
+           f'<p class="subtitle">{escape(subtitle)}</p>\n')
+
+    month = None
+    opening = deposits = withdrawals = 0
+    for transaction, balance in with_balances(transactions):
+        # A new section whenever the month changes, in ledger order
+        if transaction["date"][:7] != month:
+            if month is not None:
+                yield _month_footer(deposits, withdrawals, opening + deposits - withdrawals)
+            month = transaction["date"][:7]
+            opening = balance - signed_amount(transaction)
+            deposits = withdrawals = 0
+            yield _month_header(month, opening)
+
+        amount = format_amount(transaction["amount"])
+        if transaction["type"] == "Deposit":
+            deposits += transaction["amount"]
+            cells = f'<td class="amount deposit">{amount}</td><td></td>'
+        else:
+            withdrawals += transaction["amount"]
+            cells = f'<td></td><td class="amount withdrawal">{amount}</td>'
+        yield (f'<tr><td>{escape(transaction["date"])}</td><td>{escape(transaction["description"])}</td>'
+               f'<td>{escape(transaction.get("from_account", ""))}</td>'
+               f'<td>{escape(transaction.get("to_account", ""))}</td>'
+               f'{cells}<td class="amount">{format_amount(balance)}</td></tr>\n')
+
+    if month is None:
+        yield "<p>No transactions.</p>\n"
+    else:
+        yield _month_footer(deposits, withdrawals, opening + deposits - withdrawals)
+    yield "</body>\n</html>\n"
+
+def _month_header(month: str, opening: int) -> str:
+    try:
+        title = datetime.strptime(month, "%Y-%m").strftime("%B %Y")
+    except ValueError:
+        title = "Other dates"
+    return (f'<section>\n<h2>{html.escape(title)}</h2>\n<table>\n<thead><tr><th>Date</th><th>Description</th>'
+            f'<th>From</th><th>To</th><th class="amount">Deposit</th><th class="amount">Withdrawal</th>'
+            f'<th class="amount">Balance</th></tr></thead>\n<tbody>\n'
+            f'<tr><td colspan="6">Opening balance</td><td class="amount">{format_amount(opening)}</td></tr>\n')
+
+def _month_footer(deposits: int, withdrawals: int, closing: int) -> str:
+    return (f'</tbody>\n<tfoot><tr><td colspan="4">Total</td><td class="amount">{format_amount(deposits)}</td>'
+            f'<td class="amount">{format_amount(withdrawals)}</td><td class="amount">{format_amount(closing)}</td>'
+            f'</tr></tfoot>\n</table>\n</section>\n')
+
+def export_transactions(transactions: Iterable[Dict], file_path: Path, subtitle: str = ""):
+    """
+    Write the transactions (e.g. a filtered view) to a .csv, .jsonl or .html
+    file, with running balances counted over them. The output is produced
+    and written row by row, and replaces ``file_path`` once complete.
+    A .json file is a backup in the app's JSON format (see ``export_json``),
+    which the statement importer reads back.
+
+    Raises:
+        ValueError: for an unknown file extension
+        OSError: if the file cannot be written
+    """
+    file_path = Path(file_path)
+    suffix = file_path.suffix.lower()
+    if suffix == ".json":
+        if not export_json(transactions, file_path):
+            raise OSError(f"Could not write {file_path}")
+        return
+    if suffix == ".csv":
+        chunks = csv_chunks(transactions)
+    elif suffix == ".jsonl":
+        chunks = jsonl_chunks(transactions)
+    elif suffix in (".html", ".htm"):
+        chunks = html_chunks(transactions, subtitle)
+    else:
+        raise ValueError(f"Unknown export format: {file_path.suffix or file_path.name}")
+
+    with atomic_write(file_path, 'w', fsync=FSYNC_POLICY != "never", encoding="utf-8", newline="") as f:
+        f.writelines(chunks)
@@ -1,8 +1,28 @@
 import json
+import os
+import re
 from pathlib import Path
-from typing import Any, Dict, List
-from core.config import TRANSACTIONS_FILE, PASSCODE_FILE
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+from core.aggregates import LedgerAggregates
+from core.config import (TRANSACTIONS_FILE, SNAPSHOT_FILE, JOURNAL_FILE, PASSCODE_FILE,
+                         FSYNC_POLICY, JOURNAL_COMPACT_THRESHOLD, STARTUP_PAGE_SIZE)
+from core.transaction_store import TransactionStore
+from utils.atomic_file import atomic_write
+from utils.binary_snapshot import read_snapshot, read_snapshot_summary, write_snapshot
+from utils.instrumentation import count_rows, instrumented
+from utils.money import to_minor
 
+# Version 2 JSON files store amounts as integer minor units (version 1: float SAR)
+SNAPSHOT_VERSION = 2
+
+# Characters read at a time when streaming a snapshot
+STREAM_CHUNK_SIZE = 1 << 20
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+_number_chars = frozenset("0123456789.eE+-")
+
+@instrumented("load_json")
 def load_json(file_path: Path) -> Any:
     """Load data from a JSON file"""
     try:
@@ -13,29 +33,344 @@ def load_json(file_path: Path) -> Any:
         print(f"Error loading {file_path}: {e}")
     return None
 
+@instrumented("save_json")
 def save_json(data: Any, file_path: Path) -> bool:
-    """Save data to a JSON file"""
+    """Save data to a JSON file (replaced atomically)"""
     try:
-        file_path.parent.mkdir(exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
+        with atomic_write(file_path, 'w', fsync=FSYNC_POLICY != "never", encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=4)
         return True
     except Exception as e:
         print(f"Error saving {file_path}: {e}")
         return False
 
-def load_transactions() -> List[Dict]:
-    """Load transactions"""
-    data = load_json(TRANSACTIONS_FILE)
-    return data.get("transactions", []) if data else []
+class _JsonStream:
+    """Successive JSON values of a file, decoded one at a time from a buffer"""
+
+    def __init__(self, f: TextIO):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.chars_read = 0
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ("" at the end of the file)"""
+        while True:
+            self.pos = _whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} after {self.chars_read - len(self.buffer) + self.pos} characters")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                # The value is cut by the end of the buffer, unless the file ended
+                if not self._fill():
+                    raise
+                continue
+            # A number cut by the end of the buffer ("12." or "1e") goes on in the next chunk
+            if (end == len(self.buffer) or self.buffer[end] in _number_chars) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.chars_read += len(chunk)
+        return True
+
+def _stream_snapshot(f: TextIO, header: Dict, progress: Optional[Callable[[float], None]] = None,
+                     size: int = 0) -> Iterator[Dict]:
+    """Yield the transactions of a snapshot one by one.
+    The other top-level keys are stored in ``header`` as they are read.
+    """
+    stream = _JsonStream(f)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key != "transactions":
+            header[key] = stream.value()
+        else:
+            stream.expect("[")
+            count = 0
+            while stream.peek() != "]":
+                if count:
+                    stream.expect(",")
+                yield stream.value()
+                count += 1
+                if progress and size and count % 1000 == 0:
+                    progress(min(stream.chars_read / size, 1.0))
+            stream.expect("]")
+        if stream.peek() != ",":
+            stream.expect("}")
+            return
+        stream.expect(",")
+
+def read_snapshot_header(file_path: Path) -> Optional[Dict]:
+    """Top-level keys written before the transactions, without reading the transactions"""
+    header = {}
+    try:
+        if not file_path.exists():
+            return None
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for _ in _stream_snapshot(f, header):
+                break
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return None
+    return header
+
+@instrumented("load_json_snapshot", rows=lambda result: len(result[0]))
+def load_snapshot(file_path: Path, with_journal: bool = False,
+                  progress: Optional[Callable[[float], None]] = None) -> Tuple[List[Dict], bool]:
+    """Load the transactions of a JSON snapshot in the current format.
+    Returns the transactions and whether the file used an older format.
+    The file is streamed; ``progress`` is called with the fraction read so far.
+
+    Raises:
+        ValueError: if the file is truncated or damaged (rather than loading
+            only part of it, or nothing, which a later save would make permanent)
+        OSError: if the file cannot be read
+    """
+    header = {}
+    transactions = []
+    loaded = False
+    if file_path.exists():
+        with open(file_path, 'r', encoding='utf-8') as f:
+            transactions = list(_stream_snapshot(f, header, progress, file_path.stat().st_size))
+        loaded = True
+    if with_journal:
+        transactions = replay_journal(transactions, read_journal())
+    
+    legacy = loaded and header.get("version", 1) < SNAPSHOT_VERSION
+    if legacy:
+        for transaction in transactions:
+            transaction["amount"] = to_minor(transaction["amount"])
+    return transactions, legacy
+
+def load_summary() -> Optional[Tuple[LedgerAggregates, List[Dict]]]:
+    """Totals and latest transactions, read without loading the whole ledger.
+
+    Returns None when they cannot be known up front: the snapshot has no
+    summary header (older format), or the journal holds changes whose
+    effect on the totals is unknown.
+    """
+    summary = LedgerAggregates()
+    if SNAPSHOT_FILE.exists():
+        snapshot_file = SNAPSHOT_FILE
+        try:
+            totals, recent = read_snapshot_summary(SNAPSHOT_FILE, STARTUP_PAGE_SIZE)
+        except Exception as e:
+            print(f"Error loading {SNAPSHOT_FILE}: {e}")
+            return None
+    else:
+        # Data not yet converted from the JSON format
+        snapshot_file = TRANSACTIONS_FILE
+        header = read_snapshot_header(TRANSACTIONS_FILE)
+        if not header or "summary" not in header or header.get("version", 1) < SNAPSHOT_VERSION:
+            return None
+        totals, recent = header["summary"], header.get("recent", [])
+    summary.set_totals(**totals)
+
+    records = read_journal()
+    # A snapshot newer than the journal was written just before a crash
+    # left the journal behind: its changes may already be counted
+    if records and snapshot_file.stat().st_mtime >= JOURNAL_FILE.stat().st_mtime:
+        return None
+    for record in records:
+        operation = record.get("op")
+        previous = record.get("previous")
+        if previous is None and operation != "add":
+            return None
+        if previous is not None:
+            summary.remove(previous)
+        if operation == "delete":
+            recent = [t for t in recent if t.get("id") != record.get("id")]
+            continue
+        transaction = record["transaction"]
+        summary.add(transaction)
+        if operation == "add":
+            recent.append(transaction)
+        else:
+            recent = [transaction if t.get("id") == transaction["id"] else t for t in recent]
+    return summary, recent[-STARTUP_PAGE_SIZE:]
+
+def load_transactions(progress: Optional[Callable[[float], None]] = None) -> Iterable[Dict]:
+    """Load transactions: the binary snapshot (as a TransactionStore) plus the
+    changes journaled since. Until the first binary snapshot is written, the
+    JSON file is read instead. ``progress`` is called from time to time with
+    the fraction loaded.
+
+    Raises:
+        ValueError: if the binary snapshot or the JSON file is damaged (rather than starting empty)
+    """
+    if SNAPSHOT_FILE.exists():
+        store = read_snapshot(SNAPSHOT_FILE)
+        replay_journal_into_store(store, read_journal())
+        return store
+    transactions, _ = load_snapshot(TRANSACTIONS_FILE, with_journal=True, progress=progress)
+    return transactions
 
-def save_transactions(transactions: List[Dict], balance: float) -> bool:
-    """Save transactions"""
+def needs_snapshot() -> bool:
+    """True while the data still lives in the JSON format (written as a binary snapshot on load)"""
+    return not SNAPSHOT_FILE.exists() and TRANSACTIONS_FILE.exists()
+
+def save_transactions(transactions: Iterable[Dict]) -> bool:
+    """Save a full binary snapshot of the transactions and clear the journal"""
+    try:
+        write_transactions(transactions)
+        return True
+    except Exception as e:
+        print(f"Error saving transactions: {e}")
+        return False
+
+@instrumented("save_snapshot")
+def write_transactions(transactions: Iterable[Dict]):
+    """Like ``save_transactions``, raising the error when saving fails"""
+    if not isinstance(transactions, TransactionStore):
+        transactions = TransactionStore(transactions)
+    count_rows(len(transactions))
+    write_snapshot(transactions, SNAPSHOT_FILE, fsync=FSYNC_POLICY != "never")
+    JOURNAL_FILE.unlink(missing_ok=True)
+
+def export_json(transactions: Iterable[Dict], file_path: Path) -> bool:
+    """Write the transactions to a JSON file, readable by ``import_json``.
+    A summary header with the totals and the latest transactions comes
+    first, so it can be read without the rest of the file.
+    """
+    # Rows of the ledger's columnar store are views, copied out as dicts
+    transactions = [dict(t) for t in transactions]
+    summary = LedgerAggregates(transactions)
     data = {
-        "transactions": transactions,
-        "balance": balance
+        "version": SNAPSHOT_VERSION,
+        "summary": summary.totals(),
+        "balance": summary.balance,
+        "recent": transactions[-STARTUP_PAGE_SIZE:],
+        "transactions": transactions
     }
-    return save_json(data, TRANSACTIONS_FILE)
+    return save_json(data, file_path)
+
+def import_json(file_path: Path) -> List[Dict]:
+    """Transactions of a JSON file written by ``export_json`` (or by older versions of the app)"""
+    transactions, _ = load_snapshot(file_path)
+    return transactions
+
+def needs_compaction(pending_changes: int) -> bool:
+    """True when the journal should be folded into a new snapshot instead of growing"""
+    return pending_changes >= JOURNAL_COMPACT_THRESHOLD
+
+@instrumented("save_changes")
+def write_changes(changes: List[Tuple[str, Dict, Optional[Dict]]]):
+    """Persist a batch of (operation, transaction, previous) changes without
+    rewriting the ledger: one journal append.
+    ``previous`` is the transaction before an update or a delete.
+
+    Raises:
+        OSError: if the changes could not be saved
+    """
+    count_rows(len(changes))
+    lines = "".join(json.dumps(journal_record(*change), ensure_ascii=False, separators=(',', ':')) + "\n"
+                    for change in changes)
+    JOURNAL_FILE.parent.mkdir(exist_ok=True)
+    with open(JOURNAL_FILE, 'a', encoding='utf-8') as f:
+        f.write(lines)
+        f.flush()
+        if FSYNC_POLICY == "always":
+            os.fsync(f.fileno())
+
+def journal_record(operation: str, transaction: Dict, previous: Optional[Dict] = None) -> Dict:
+    """Journal entry for one change ("add", "update" or "delete").
+    The previous content lets the snapshot's summary be brought up to date.
+    """
+    if operation == "delete":
+        record = {"op": operation, "id": transaction["id"]}
+    else:
+        record = {"op": operation, "transaction": transaction}
+    if previous is not None:
+        record["previous"] = dict(previous)
+    return record
+
+def read_journal() -> List[Dict]:
+    """Read the journal records, stopping at a line left incomplete by a crash"""
+    records = []
+    try:
+        if JOURNAL_FILE.exists():
+            with open(JOURNAL_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+    except Exception as e:
+        print(f"Error loading {JOURNAL_FILE}: {e}")
+    return records
+
+def journal_size() -> int:
+    """Size of the journal in bytes (0 when there is nothing to replay)"""
+    try:
+        return JOURNAL_FILE.stat().st_size
+    except OSError:
+        return 0
+
+def replay_journal(transactions: List[Dict], records: List[Dict]) -> List[Dict]:
+    """Apply journal records to a snapshot.
+
+    Replaying is idempotent (adds and updates overwrite by id, deleting a
+    missing id is ignored), so records that already made it into the
+    snapshot before a crash can safely be applied again.
+    """
+    if not records:
+        return transactions
+    
+    positions = {t.get("id"): i for i, t in enumerate(transactions)}
+    for record in records:
+        if record.get("op") == "delete":
+            index = positions.pop(record.get("id"), None)
+            if index is not None:
+                transactions[index] = None
+        else:
+            transaction = record["transaction"]
+            index = positions.get(transaction["id"])
+            if index is None:
+                positions[transaction["id"]] = len(transactions)
+                transactions.append(transaction)
+            else:
+                transactions[index] = transaction
+    
+    return [t for t in transactions if t is not None]
+
+def replay_journal_into_store(store: TransactionStore, records: List[Dict]):
+    """Apply journal records to a binary snapshot's store, idempotently like ``replay_journal``"""
+    for record in records:
+        if record.get("op") == "delete":
+            try:
+                store.delete(store.locate(record.get("id")))
+            except KeyError:
+                pass
+            continue
+        transaction = record["transaction"]
+        try:
+            position = store.locate(transaction["id"])
+        except KeyError:
+            store.append(transaction)
+        else:
+            store.update(position, {k: v for k, v in transaction.items() if k != "id"})
 
 def load_passcode() -> str:
     """Load passcode"""
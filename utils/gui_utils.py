@@ -0,0 +1,248 @@
+import tkinter as tk
+from bisect import bisect_left
+from tkinter import ttk
+from typing import Callable, Hashable, List, Optional, Sequence, Set, Tuple
+
+# row_builder(index) -> (key, values, tags)
+RowBuilder = Callable[[int], Tuple[Hashable, Sequence, Sequence]]
+
+
+def _increasing(values: Sequence[int]) -> Set[int]:
+    """Indices of a longest increasing subsequence of ``values``"""
+    tails: List[int] = []
+    tail_indices: List[int] = []
+    previous = [-1] * len(values)
+    for i, value in enumerate(values):
+        k = bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_indices.append(i)
+        else:
+            tails[k] = value
+            tail_indices[k] = i
+        previous[i] = tail_indices[k - 1] if k else -1
+
+    indices = set()
+    i = tail_indices[-1] if tail_indices else -1
+    while i >= 0:
+        indices.add(i)
+        i = previous[i]
+    return indices
+
+
+class VirtualTreeview:
+    """Treeview that only materializes the rows visible in its viewport.
+
+    Rows are read on demand from an external model through ``row_builder``.
+    A small pool of Treeview items is recycled while scrolling, so the cost
+    of a redraw depends on the window height, not on the number of rows.
+    Redraws are incremental: an item that already shows a row (by key) keeps
+    it, and only the cells whose text changed are written to Tk.
+    """
+
+    def __init__(self, parent, columns, row_builder: RowBuilder, height: int = 20,
+                 overscan: int = 1, **kwargs):
+        self.tree = ttk.Treeview(parent, columns=columns, height=height, **kwargs)
+        self.columns = tuple(columns)
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+
+        self.row_builder = row_builder
+        self.overscan = overscan
+
+        self._count = 0
+        self._offset = 0
+        self._page = height
+        self._slots: List[str] = []
+        self._keys: List[Hashable] = []
+        # (values, tags) currently displayed by each slot
+        self._shown: List[Tuple[tuple, tuple]] = []
+        self._selected_key: Optional[Hashable] = None
+
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<ButtonPress-1>", self._on_click)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll_units(-3))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_units(3))
+        self.tree.bind("<Up>", lambda e: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self._move_selection(-self._page))
+        self.tree.bind("<Next>", lambda e: self._move_selection(self._page))
+        self.tree.bind("<Home>", lambda e: self._move_selection(-self._count))
+        self.tree.bind("<End>", lambda e: self._move_selection(self._count))
+
+    # Model
+
+    def set_row_count(self, count: int, reset: bool = False):
+        """Point the view at a model of ``count`` rows and redraw"""
+        self._count = count
+        if reset:
+            self._offset = 0
+            self._selected_key = None
+        self.refresh()
+
+    def refresh(self):
+        """Redraw the rows currently in the viewport"""
+        self._offset = max(0, min(self._offset, self._max_offset()))
+        visible = max(0, min(self._page + self.overscan, self._count - self._offset))
+        rows = [self.row_builder(self._offset + n) for n in range(visible)]
+
+        # Slots keep the row they show if it is still visible; the others are reused
+        by_key = {key: n for n, key in enumerate(self._keys) if key is not None}
+        wanted = {key for key, _, _ in rows}
+        free = iter([n for n, key in enumerate(self._keys) if key is None or key not in wanted])
+
+        slots, keys, shown = [], [], []
+        selected_slot = ()
+        for key, values, tags in rows:
+            values, tags = tuple(values), tuple(tags)
+            n = by_key.pop(key, None) if key is not None else None
+            if n is None:
+                n = next(free, None)
+            if n is None:
+                slot = self.tree.insert("", "end", values=values, tags=tags)
+            else:
+                slot = self._slots[n]
+                self._patch(slot, self._shown[n], values, tags)
+            slots.append(slot)
+            keys.append(key)
+            shown.append((values, tags))
+            if key is not None and key == self._selected_key:
+                selected_slot = slot
+
+        for n in free:
+            self.tree.delete(self._slots[n])
+        self._reorder(slots)
+        self._slots, self._keys, self._shown = slots, keys, shown
+
+        self.tree.selection_set(selected_slot)
+        # Keep the real Treeview pinned to the top; scrolling is virtual
+        self.tree.yview_moveto(0)
+        self._update_scrollbar()
+
+    def _patch(self, slot: str, shown: Tuple[tuple, tuple], values: tuple, tags: tuple):
+        """Write the cells of ``slot`` that differ from what it shows"""
+        old_values, old_tags = shown
+        if tags != old_tags:
+            self.tree.item(slot, tags=tags)
+        if len(values) != len(old_values):
+            self.tree.item(slot, values=values)
+            return
+        changed = [i for i, (new, old) in enumerate(zip(values, old_values)) if new != old]
+        if len(changed) == 1:
+            # e.g. the balance of the rows after an edited transaction
+            self.tree.set(slot, self.columns[changed[0]], values[changed[0]])
+        elif changed:
+            self.tree.item(slot, values=values)
+
+    def _reorder(self, slots: List[str]):
+        """Move items so the Treeview lists them in the order of ``slots``.
+        Items already in the right relative order stay; only the others move.
+        """
+        order = list(self.tree.get_children())
+        position = {slot: i for i, slot in enumerate(order)}
+        keep = _increasing([position[slot] for slot in slots])
+        for index, slot in enumerate(slots):
+            if index in keep:
+                continue
+            # Tk counts the target index without the item being moved
+            order.remove(slot)
+            target = order.index(slots[index - 1]) + 1 if index else 0
+            order.insert(target, slot)
+            self.tree.move(slot, "", target)
+
+    # Selection
+
+    def selected_key(self) -> Optional[Hashable]:
+        """Key of the selected row, even if it is scrolled out of view"""
+        return self._selected_key
+
+    def selected_index(self) -> Optional[int]:
+        """Model index of the selected row if it is in the viewport"""
+        if self._selected_key is not None and self._selected_key in self._keys:
+            return self._offset + self._keys.index(self._selected_key)
+        return None
+
+    def select(self, key: Optional[Hashable]):
+        self._selected_key = key
+        self.refresh()
+
+    def see(self, index: int):
+        """Scroll so that the row at ``index`` is visible"""
+        if index < self._offset:
+            self._offset = index
+        elif index >= self._offset + self._page:
+            self._offset = index - self._page + 1
+        self.refresh()
+
+    # Scrolling
+
+    def yview(self, *args):
+        """Scrollbar command: ``moveto fraction`` or ``scroll n units|pages``"""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._offset = int(float(args[1]) * self._count)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self._page
+            self._offset += step
+        self.refresh()
+
+    def _scroll_units(self, units: int):
+        self._offset += units
+        self.refresh()
+        return "break"
+
+    def _on_mousewheel(self, event):
+        if event.delta:
+            units = -event.delta // 120 * 3 if abs(event.delta) >= 120 else -event.delta
+            return self._scroll_units(units)
+        return "break"
+
+    def _update_scrollbar(self):
+        if self._count:
+            first = self._offset / self._count
+            last = min(1.0, (self._offset + self._page) / self._count)
+        else:
+            first, last = 0.0, 1.0
+        self.scrollbar.set(first, last)
+
+    def _max_offset(self) -> int:
+        return max(0, self._count - self._page)
+
+    # Events
+
+    def _on_configure(self, event=None):
+        page = self._measure_page()
+        if page != self._page:
+            self._page = page
+            self.refresh()
+
+    def _measure_page(self) -> int:
+        """Number of fully visible rows for the current widget height"""
+        if self._slots:
+            bbox = self.tree.bbox(self._slots[0])
+            if bbox:
+                _, top, _, row_height = bbox
+                if row_height > 0:
+                    return max(1, (self.tree.winfo_height() - top) // row_height)
+        return self._page
+
+    def _on_click(self, event):
+        slot = self.tree.identify_row(event.y)
+        if slot in self._slots:
+            self._selected_key = self._keys[self._slots.index(slot)]
+
+    def _move_selection(self, step: int):
+        if not self._count:
+            return "break"
+        if self._selected_key in self._keys:
+            index = self._offset + self._keys.index(self._selected_key) + step
+        else:
+            index = self._offset
+        index = max(0, min(index, self._count - 1))
+        key = self.row_builder(index)[0]
+        self._selected_key = key
+        self.see(index)
+        return "break"
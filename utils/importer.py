@@ -0,0 +1,514 @@
+import csv
+import heapq
+import html
+import io
+import os
+import pickle
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import chain, islice
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+from core.aggregates import BALANCE_TOO_LARGE
+from core.balance_index import signed_amount
+from core.config import (IMPORT_BATCH_SIZE, IMPORT_CHUNK_BYTES, IMPORT_DATE_FORMATS, IMPORT_MAX_ERRORS,
+                         IMPORT_PARALLEL_MIN_BYTES, IMPORT_SORT_ROWS)
+from utils.file_utils import import_json, read_snapshot_header
+from utils.money import MAX_MINOR, format_amount, parse_amount
+from utils.validation import validate_amount, validate_required_fields
+
+# A parsed statement row: its line (CSV) or transaction number (OFX), and its
+# fields by canonical name, as text. The "decimal" field holds the decimal
+# separator of the amounts when it is not "."
+Record = Tuple[int, Dict[str, str]]
+
+# CSV headings understood by the importer (compared case-insensitively)
+CSV_COLUMNS = {
+    "date": "date", "transaction date": "date", "posting date": "date",
+    "booking date": "date", "value date": "date",
+    "type": "type", "transaction type": "type",
+    "amount": "amount",
+    "deposit": "deposit", "credit": "deposit",
+    "withdrawal": "withdrawal", "debit": "withdrawal",
+    "from": "from_account", "from account": "from_account",
+    "to": "to_account", "to account": "to_account",
+    "description": "description", "details": "description", "memo": "description",
+    "narrative": "description",
+    "counterparty": "counterparty", "payee": "counterparty", "name": "counterparty",
+}
+
+TRANSACTION_TYPES = {"deposit": "Deposit", "credit": "Deposit", "cr": "Deposit",
+                     "withdrawal": "Withdrawal", "debit": "Withdrawal", "dr": "Withdrawal"}
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+_OFX_CHUNK_SIZE = 1 << 16
+# Rows pickled together in a temporary file of sorted rows
+_SPILL_BLOCK = 1000
+
+
+class RowError(NamedTuple):
+    """A statement row that was not imported"""
+    row: int
+    message: str
+
+
+class StatementChunk(NamedTuple):
+    """Bytes ``start`` to ``end`` of a statement file, parsed after ``heading`` (the CSV column names)"""
+    start: int
+    end: int
+    heading: str
+
+
+class ParsedChunk(NamedTuple):
+    length: int  # lines (CSV) or entries (OFX) of the chunk, to number the rows of the next ones
+    rows_file: str  # temporary file of the (row in the chunk, transaction) pairs, in date order
+    failed: int
+    errors: List[RowError]
+
+
+class ImportResult(NamedTuple):
+    added: int
+    failed: int
+    errors: List[RowError]  # the first IMPORT_MAX_ERRORS rejected rows
+    cancelled: bool = False  # stopped before the end; the batches added so far are kept
+
+
+class _Rejections:
+    """Rejected rows: all are counted, the first IMPORT_MAX_ERRORS kept"""
+
+    def __init__(self):
+        self.failed = 0
+        self.errors: List[RowError] = []
+
+    def add(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append(RowError(row, message))
+
+
+def read_statement(file_path: Path) -> Iterator[Record]:
+    """
+    Records of a CSV or OFX/QFX bank statement, read as a stream, or of a
+    JSON backup written by the app's export
+
+    Raises:
+        ValueError: if the file is not a statement the importer understands
+    """
+    file_path = Path(file_path)
+    if _is_json(file_path):
+        yield from parse_json(file_path)
+        return
+    with open(file_path, encoding="utf-8-sig", newline="") as stream:
+        if _is_ofx(file_path):
+            yield from parse_ofx(stream)
+        else:
+            yield from parse_csv(stream)
+
+def parse_csv(stream: TextIO) -> Iterator[Record]:
+    """
+    Records of a CSV statement whose first line names the columns (see CSV_COLUMNS).
+    Commas, semicolons and tabs are recognized as separators; amounts of a
+    file separated by semicolons are read with decimal commas ("1.234,50").
+
+    Raises:
+        ValueError: if there is no date column or no amount column
+    """
+    heading = stream.readline()
+    if not heading.strip():
+        return
+    try:
+        dialect = csv.Sniffer().sniff(heading, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(chain([heading], stream), dialect)
+    columns = [CSV_COLUMNS.get(name.strip().casefold().replace("_", " ")) for name in next(reader)]
+    if "date" not in columns or not {"amount", "deposit", "withdrawal"} & set(columns):
+        raise ValueError("The file needs a date column and an amount (or deposit and withdrawal) column")
+
+    decimal = "," if dialect.delimiter == ";" else "."
+    for values in reader:
+        if any(value.strip() for value in values):
+            fields = {column: value for column, value in zip(columns, values) if column}
+            if decimal != ".":
+                fields["decimal"] = decimal
+            yield reader.line_num, fields
+
+def parse_ofx(stream: TextIO) -> Iterator[Record]:
+    """Records of the <STMTTRN> entries of an OFX/QFX statement (SGML or XML)"""
+    number = 0
+    fields = None
+    pending = ""
+    while True:
+        chunk = stream.read(_OFX_CHUNK_SIZE)
+        text = pending + chunk
+        # A value runs up to the next tag: keep the last one for the next chunk
+        end = text.rfind("<") if chunk else len(text)
+        if end < 0:
+            end = 0
+        for closing, tag, value in _OFX_TAG.findall(text, 0, end):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if fields is not None:
+                    number += 1
+                    yield number, _ofx_record(fields)
+                fields = None if closing else {}
+            elif fields is not None and not closing:
+                # Entities such as "&amp;" are written in SGML and XML files alike
+                fields[tag] = html.unescape(value.strip())
+        pending = text[end:]
+        if not chunk:
+            break
+    if fields is not None:
+        yield number + 1, _ofx_record(fields)
+
+def parse_json(file_path: Path) -> Iterator[Record]:
+    """
+    Records of the transactions of a JSON backup (see ``import_json``), numbered from 1
+
+    Raises:
+        ValueError: if the file is not a JSON backup
+    """
+    transactions = import_json(file_path)
+    if not transactions and read_snapshot_header(file_path) is None:
+        raise ValueError("The file is not a JSON backup of the app")
+    for number, transaction in enumerate(transactions, 1):
+        amount = transaction.get("amount")
+        yield number, {"date": str(transaction.get("date", "")),
+                       "type": str(transaction.get("type", "")),
+                       "amount": format_amount(amount, grouping=False) if isinstance(amount, int) else "",
+                       "from_account": str(transaction.get("from_account") or ""),
+                       "to_account": str(transaction.get("to_account") or ""),
+                       "description": str(transaction.get("description") or "")}
+
+def _ofx_record(fields: Dict[str, str]) -> Dict[str, str]:
+    return {"date": fields.get("DTPOSTED", "")[:8],
+            "amount": fields.get("TRNAMT", ""),
+            "counterparty": fields.get("NAME") or fields.get("PAYEE", ""),
+            "description": fields.get("MEMO", "")}
+
+def parse_statement_date(text: str) -> str:
+    """
+    Convert a statement date to "YYYY-MM-DD"
+
+    Raises:
+        ValueError: if the date matches none of the accepted formats
+    """
+    text = text.strip()
+    try:
+        # ISO dates, possibly with a time; the whole field must match
+        return datetime.fromisoformat(text).date().isoformat()
+    except ValueError:
+        pass
+    for date_format in IMPORT_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date: {text!r}")
+
+def to_transaction(fields: Dict[str, str]) -> Dict:
+    """
+    Transaction (without id) described by the fields of a record
+
+    The type comes from a type column, the sign of a single amount column,
+    or whichever of the deposit and withdrawal columns holds an amount.
+
+    Raises:
+        ValueError: with the reason the record is rejected
+    """
+    if not fields.get("date", "").strip():
+        raise ValueError("Missing date")
+    transaction_date = parse_statement_date(fields["date"])
+
+    decimal = fields.get("decimal", ".")
+    amount_text = _clean_amount(fields.get("amount", ""), decimal)
+    deposit_text = _clean_amount(fields.get("deposit", ""), decimal)
+    withdrawal_text = _clean_amount(fields.get("withdrawal", ""), decimal)
+    type_text = fields.get("type", "").strip().casefold()
+    if type_text:
+        transaction_type = TRANSACTION_TYPES.get(type_text)
+        if transaction_type is None:
+            raise ValueError(f"Unknown transaction type: {fields['type']!r}")
+        amount_text = amount_text.lstrip("-") or (deposit_text if transaction_type == "Deposit"
+                                                  else withdrawal_text).lstrip("-")
+    elif amount_text:
+        transaction_type = "Withdrawal" if amount_text.startswith("-") else "Deposit"
+        amount_text = amount_text.lstrip("-+")
+    else:
+        # Separate columns, the other one empty or zero
+        is_deposit = validate_amount(deposit_text)[0]
+        is_withdrawal = validate_amount(withdrawal_text.lstrip("-"))[0]
+        if is_deposit and is_withdrawal:
+            raise ValueError("Both a deposit and a withdrawal amount")
+        transaction_type = "Withdrawal" if is_withdrawal else "Deposit"
+        amount_text = withdrawal_text.lstrip("-") if is_withdrawal else deposit_text
+
+    # "Invalid amount" or "Amount out of range" (beyond the 64-bit amount column)
+    amount = parse_amount(amount_text) if amount_text else 0
+    if amount <= 0:
+        raise ValueError("Amount must be a positive number")
+
+    counterparty = fields.get("counterparty", "").strip()
+    description = fields.get("description", "").strip() or counterparty
+    if not validate_required_fields(description):
+        raise ValueError("Missing description")
+    from_account = fields.get("from_account", "").strip()
+    to_account = fields.get("to_account", "").strip()
+    if transaction_type == "Deposit":
+        from_account = from_account or counterparty
+    else:
+        to_account = to_account or counterparty
+
+    return {
+        "date": transaction_date,
+        "type": transaction_type,
+        "amount": amount,
+        "from_account": from_account,
+        "to_account": to_account,
+        "description": description
+    }
+
+def _clean_amount(text: str, decimal: str = ".") -> str:
+    """
+    Amount text in the "1234.50" form read by ``parse_amount``, without the
+    spaces and thousands separators of "1,234.50", "1 234.50" or "1.234,50"
+
+    Raises:
+        ValueError: if the separators do not fit ``decimal``, e.g. "12,50"
+            with decimal points, rather than reading it as 1250
+    """
+    text = text.replace(" ", "").replace("\xa0", "").strip()
+    thousands = "." if decimal == "," else ","
+    whole, _, fraction = text.partition(decimal)
+    if thousands in fraction or decimal in fraction:
+        raise ValueError(f"Invalid amount: {text!r}")
+    if thousands in whole:
+        groups = whole.lstrip("+-").split(thousands)
+        if not 0 < len(groups[0]) <= 3 or any(len(group) != 3 for group in groups[1:]):
+            raise ValueError(f"Invalid amount: {text!r}")
+        whole = whole.replace(thousands, "")
+    return f"{whole}.{fraction}" if fraction else whole
+
+def import_transactions(ledger, records: Iterable[Record], batch_size: int = IMPORT_BATCH_SIZE,
+                        progress: Optional[Callable[[int], None]] = None,
+                        cancelled: Optional[Callable[[], bool]] = None) -> ImportResult:
+    """
+    Add the valid records after the ledger's transactions, in date order
+    (records of the same day keep their order), ``batch_size`` at a time.
+    Rejected rows are reported, not raised; as in the app, a withdrawal may
+    not exceed the balance. Saving and redrawing are left to the caller, once.
+
+    ``progress`` is called with the number of rows added after each batch;
+    once ``cancelled`` returns True no further batch is added.
+    """
+    rejections = _Rejections()
+    rows = sorted_by_date(_validated(records, rejections))
+    return _add_in_batches(ledger, rows, rejections, batch_size, progress, cancelled)
+
+def import_file(ledger, file_path: Path, workers: Optional[int] = None,
+                progress: Optional[Callable[[int], None]] = None,
+                cancelled: Optional[Callable[[], bool]] = None) -> ImportResult:
+    """
+    Import a CSV or OFX/QFX statement into the ledger, in date order (rows of
+    the same day keep the order of the file), after its transactions.
+    ``progress`` and ``cancelled`` are as for ``import_transactions``.
+
+    Large files are split into chunks parsed and validated by ``workers``
+    processes (one per CPU by default), then merged by date.
+
+    Raises:
+        OSError: if the file cannot be read
+        ValueError: if it is not a statement the importer understands
+    """
+    file_path = Path(file_path)
+    chunks = split_statement(file_path)
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        return import_transactions(ledger, read_statement(file_path), progress=progress, cancelled=cancelled)
+
+    # Each worker leaves the rows of its chunk, sorted, in a temporary file;
+    # they are merged from there, a few at a time
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(parse_chunk, file_path, chunk) for chunk in chunks]
+    parsed = [future.result() for future in futures if future.exception() is None]
+    try:
+        for future in futures:
+            # The first error, once the files of the other chunks are known
+            future.result()
+
+        # Rows are numbered within their chunk: shift them by the chunks before
+        rejections = _Rejections()
+        streams = []
+        offset = 0
+        for chunk in parsed:
+            streams.append(_shifted(_read_rows(Path(chunk.rows_file)), offset))
+            rejections.failed += chunk.failed
+            rejections.errors.extend(RowError(offset + row, message) for row, message in chunk.errors)
+            offset += chunk.length
+        rows = heapq.merge(*streams, key=_row_date)
+        return _add_in_batches(ledger, rows, rejections, IMPORT_BATCH_SIZE, progress, cancelled)
+    finally:
+        for chunk in parsed:
+            Path(chunk.rows_file).unlink(missing_ok=True)
+
+def split_statement(file_path: Path, chunk_bytes: int = IMPORT_CHUNK_BYTES,
+                    min_bytes: int = IMPORT_PARALLEL_MIN_BYTES) -> List[StatementChunk]:
+    """
+    Byte ranges of a statement that can be parsed independently: whole lines
+    of a CSV file (multi-line quoted fields are not supported across chunks),
+    whole <STMTTRN> entries of an OFX file. A JSON backup, or a file smaller
+    than ``min_bytes``, is a single chunk.
+    """
+    file_path = Path(file_path)
+    size = file_path.stat().st_size
+    if size < min_bytes or _is_json(file_path):
+        return [StatementChunk(0, size, "")]
+
+    is_ofx = _is_ofx(file_path)
+    with open(file_path, "rb") as f:
+        heading = "" if is_ofx else f.readline().decode("utf-8-sig")
+        starts = [0]
+        while starts[-1] + chunk_bytes < size:
+            start = _next_boundary(f, starts[-1] + chunk_bytes, b"<STMTTRN>" if is_ofx else b"\n")
+            if start >= size:
+                break
+            starts.append(start)
+    return [StatementChunk(start, end, heading if start else "")
+            for start, end in zip(starts, starts[1:] + [size])]
+
+def _next_boundary(f: BinaryIO, offset: int, marker: bytes) -> int:
+    """Offset where the next chunk starts: after the next newline, or at the next OFX entry"""
+    f.seek(offset)
+    if marker == b"\n":
+        f.readline()
+        return f.tell()
+    tail = b""
+    while True:
+        block = f.read(_OFX_CHUNK_SIZE)
+        if not block:
+            return f.tell()
+        data = tail + block
+        index = data.find(marker)
+        if index >= 0:
+            return f.tell() - len(data) + index
+        tail = data[-(len(marker) - 1):]
+
+def parse_chunk(file_path: Path, chunk: StatementChunk) -> ParsedChunk:
+    """Parse and validate one chunk of a statement, its rows sorted by date
+    into a temporary file (run in a worker process)"""
+    with open(file_path, "rb") as f:
+        f.seek(chunk.start)
+        text = f.read(chunk.end - chunk.start).decode("utf-8-sig" if chunk.start == 0 else "utf-8")
+    stream = io.StringIO(chunk.heading + text, newline="")
+    is_ofx = _is_ofx(file_path)
+    if is_ofx:
+        records = parse_ofx(stream)
+    else:
+        # Number lines from the chunk's first line, not from the repeated heading
+        records = ((line - 1 if chunk.heading else line, fields) for line, fields in parse_csv(stream))
+
+    rejections = _Rejections()
+    rows = list(_validated(records, rejections))
+    rows.sort(key=_row_date)
+    length = rejections.failed + len(rows) if is_ofx else text.count("\n")
+    return ParsedChunk(length, str(_write_rows(rows)), rejections.failed, rejections.errors)
+
+def sorted_by_date(rows: Iterable[Tuple[int, Dict]], run_size: int = IMPORT_SORT_ROWS) -> Iterator[Tuple[int, Dict]]:
+    """
+    (row, transaction) pairs in date order, rows of the same day in their order.
+    Up to ``run_size`` rows are sorted in memory; longer inputs are sorted in
+    runs written to temporary files, then merged.
+    """
+    rows = iter(rows)
+    run_files = []
+    try:
+        while True:
+            run = list(islice(rows, run_size))
+            run.sort(key=_row_date)
+            if not run_files and len(run) < run_size:
+                yield from run
+                return
+            if run:
+                run_files.append(_write_rows(run))
+            if len(run) < run_size:
+                break
+        # Runs are in input order, so the merge keeps the rows of a day in order
+        yield from heapq.merge(*map(_read_rows, run_files), key=_row_date)
+    finally:
+        for run_file in run_files:
+            run_file.unlink(missing_ok=True)
+
+def _write_rows(rows: List[Tuple[int, Dict]]) -> Path:
+    """A temporary file holding ``rows``, read back by ``_read_rows``"""
+    with tempfile.NamedTemporaryFile("wb", prefix="import-", suffix=".rows", delete=False) as f:
+        for start in range(0, len(rows), _SPILL_BLOCK):
+            pickle.dump(rows[start:start + _SPILL_BLOCK], f, pickle.HIGHEST_PROTOCOL)
+    return Path(f.name)
+
+def _read_rows(file_path: Path) -> Iterator[Tuple[int, Dict]]:
+    with open(file_path, "rb") as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+def _validated(records: Iterable[Record], rejections: _Rejections) -> Iterator[Tuple[int, Dict]]:
+    for row, fields in records:
+        try:
+            yield row, to_transaction(fields)
+        except (ValueError, ArithmeticError) as e:
+            rejections.add(row, str(e))
+
+def _add_in_batches(ledger, rows: Iterable[Tuple[int, Dict]], rejections: _Rejections, batch_size: int,
+                    progress: Optional[Callable[[int], None]] = None,
+                    cancelled: Optional[Callable[[], bool]] = None) -> ImportResult:
+    added = 0
+    balance = ledger.aggregates.balance
+    # Withdrawals never exceed the balance, so only deposits can reach the limit
+    deposits = ledger.aggregates.total_deposits
+    batch = []
+    stopped = False
+    for row, transaction in rows:
+        if cancelled is not None and cancelled():
+            stopped = True
+            break
+        if transaction["type"] == "Withdrawal" and transaction["amount"] > balance:
+            rejections.add(row, "Insufficient balance for withdrawal")
+            continue
+        if transaction["type"] == "Deposit":
+            if transaction["amount"] > MAX_MINOR - deposits:
+                rejections.add(row, BALANCE_TOO_LARGE)
+                continue
+            deposits += transaction["amount"]
+        balance += signed_amount(transaction)
+        batch.append(transaction)
+        if len(batch) >= batch_size:
+            added += ledger.extend(batch)
+            batch = []
+            if progress is not None:
+                progress(added)
+    if batch and not stopped:
+        added += ledger.extend(batch)
+        if progress is not None:
+            progress(added)
+    errors = sorted(rejections.errors)[:IMPORT_MAX_ERRORS]
+    return ImportResult(added, rejections.failed, errors, stopped)
+
+def _shifted(rows: Iterable[Tuple[int, Dict]], offset: int) -> Iterator[Tuple[int, Dict]]:
+    for row, transaction in rows:
+        yield offset + row, transaction
+
+def _is_ofx(file_path: Path) -> bool:
+    return Path(file_path).suffix.lower() in (".ofx", ".qfx")
+
+def _is_json(file_path: Path) -> bool:
+    return Path(file_path).suffix.lower() == ".json"
+
+def _row_date(item: Tuple[int, Dict]) -> str:
+    # ISO dates sort as text
+    return item[1]["date"]
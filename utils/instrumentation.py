@@ -0,0 +1,167 @@
+import cProfile
+import functools
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional
+
+from core.config import DATA_DIR, INSTRUMENT, INSTRUMENT_HISTORY, SLOW_OPERATION_MS
+
+logger = logging.getLogger(__name__)
+
+
+class OperationRecord(NamedTuple):
+    """One timed run of an instrumented operation"""
+    name: str
+    started: float  # time.time() when it started
+    seconds: float
+    rows: Optional[int]
+    # Change of the memory traced by tracemalloc (other threads included)
+    allocated: Optional[int]
+    thread: str
+
+
+class Instrumentation:
+    """Opt-in timing of the app's hot paths.
+
+    While enabled, each run of an operation marked with ``instrumented`` is
+    recorded (wall time, rows handled, memory allocated) in a ring buffer of
+    the latest ``history`` runs, and runs slower than ``slow_ms`` are logged.
+    While disabled an operation costs one attribute check.
+
+    A profile can be recorded on demand: each outermost instrumented run (in
+    any thread) is profiled with cProfile until ``stop_profile``.
+    """
+
+    def __init__(self, enabled: bool = False, history: int = INSTRUMENT_HISTORY,
+                 slow_ms: float = SLOW_OPERATION_MS):
+        self.enabled = False
+        self.slow_ms = slow_ms
+        self.records = deque(maxlen=history)
+        self._local = threading.local()
+        self._started_tracing = False
+        self._profiles: Optional[List[cProfile.Profile]] = None
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        """Start recording; allocations are traced from now on"""
+        if self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording (the records are kept) and any profile in progress"""
+        self.enabled = False
+        self._profiles = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @property
+    def profiling(self) -> bool:
+        return self._profiles is not None
+
+    def start_profile(self):
+        self._profiles = []
+
+    def stop_profile(self, file_path: Optional[Path] = None) -> Optional[Path]:
+        """Write the profile recorded since ``start_profile`` (readable with
+        ``python -m pstats``) and return its path, or None if nothing ran"""
+        profiles, self._profiles = self._profiles, None
+        # A profile of calls too quick to record anything cannot be loaded by pstats
+        profiles = [profile for profile in profiles or () if profile.getstats()]
+        if not profiles:
+            return None
+        if file_path is None:
+            file_path = DATA_DIR / "profiles" / f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.prof"
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        pstats.Stats(*profiles).dump_stats(str(file_path))
+        return file_path
+
+    def recent(self, count: int) -> List[OperationRecord]:
+        """The latest ``count`` records, newest first"""
+        records = list(self.records)[-count:]
+        records.reverse()
+        return records
+
+    def count_rows(self, rows: int):
+        """Set the rows handled by the operation running in this thread (if any)"""
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1][0] = rows
+
+    def run(self, name: str, func: Callable, args, kwargs, rows: Optional[Callable] = None):
+        """Call ``func``, recording the run as operation ``name``"""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        # [rows] of this run, set by count_rows or from the result
+        frame = [None]
+        stack.append(frame)
+
+        # Only the outermost operation is profiled: a thread has one profiler at a time
+        profiles = self._profiles
+        profile = None
+        if profiles is not None and len(stack) == 1:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Since Python 3.12 only one profiler can be active in the process:
+                # an operation overlapping one being profiled runs unprofiled
+                profile = None
+        tracing = tracemalloc.is_tracing()
+        memory = tracemalloc.get_traced_memory()[0] if tracing else 0
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            if rows is not None:
+                frame[0] = rows(result)
+            return result
+        finally:
+            seconds = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            stack.pop()
+            allocated = tracemalloc.get_traced_memory()[0] - memory if tracing and tracemalloc.is_tracing() else None
+            record = OperationRecord(name, started, seconds, frame[0], allocated, threading.current_thread().name)
+            # deque.append is thread-safe
+            self.records.append(record)
+            if profile is not None:
+                profiles.append(profile)
+            if seconds * 1000 >= self.slow_ms:
+                logger.warning("Slow operation: %s took %.0f ms (rows: %s, allocated: %s bytes, thread: %s)",
+                               name, seconds * 1000, record.rows, record.allocated, record.thread)
+
+
+# Instrumentation of the app, enabled with PAS_INSTRUMENT=1 or from the Tools menu
+instrumentation = Instrumentation(enabled=INSTRUMENT)
+
+def instrumented(name: str, rows: Optional[Callable[..., int]] = None) -> Callable:
+    """Decorator recording each call as operation ``name`` while instrumentation is enabled.
+    ``rows`` gives the rows handled from the result (e.g. ``len``); otherwise the
+    function can report them with ``count_rows``.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return func(*args, **kwargs)
+            return instrumentation.run(name, func, args, kwargs, rows)
+        return wrapper
+    return decorator
+
+def count_rows(rows: int):
+    """Report the rows handled by the instrumented operation running in this thread"""
+    if instrumentation.enabled:
+        instrumentation.count_rows(rows)
@@ -0,0 +1,39 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Amounts are stored as integer halalas (1/100 SAR), never as floats
+MINOR_UNITS = 100
+_CENT = Decimal("0.01")
+# Amounts are kept in 64-bit columns
+MAX_MINOR = 2 ** 63 - 1
+
+
+def parse_amount(text: str) -> int:
+    """
+    Parse a decimal amount such as "12.5" into minor units (1250)
+
+    Raises:
+        ValueError: if the text is not a finite number, or is too large to store
+    """
+    try:
+        value = Decimal(str(text).strip())
+        if not value.is_finite():
+            raise ValueError(f"Invalid amount: {text!r}")
+        minor = int(value.quantize(_CENT, rounding=ROUND_HALF_UP) * MINOR_UNITS)
+    except ArithmeticError:
+        # InvalidOperation, e.g. "1e30" has more digits than the context allows
+        raise ValueError(f"Invalid amount: {text!r}") from None
+    if not -MAX_MINOR <= minor <= MAX_MINOR:
+        raise ValueError(f"Amount out of range: {text!r}")
+    return minor
+
+def to_minor(value) -> int:
+    """Convert a legacy amount in SAR (float or int, as stored before) to minor units"""
+    return parse_amount(repr(value) if isinstance(value, float) else str(value))
+
+def format_amount(minor: int, grouping: bool = True) -> str:
+    """Format minor units as "1,234.50" (or "1234.50" without grouping)"""
+    sign = "-" if minor < 0 else ""
+    major, cents = divmod(abs(minor), MINOR_UNITS)
+    if grouping:
+        return f"{sign}{major:,}.{cents:02d}"
+    return f"{sign}{major}.{cents:02d}"
@@ -0,0 +1,111 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core.config import SAVE_COALESCE_MS
+from core.transaction_store import TransactionStore
+from utils.file_utils import write_changes, write_transactions
+
+
+class BackgroundSaver:
+    """Saves the ledger from a worker thread, so the UI never waits for the disk.
+
+    Changes queued while the worker waits or writes are saved together: one
+    journal append and one fsync for a burst of edits. A queued snapshot
+    replaces the changes queued before it, as it already contains them.
+
+    When a write fails, ``error`` holds the exception until a later write
+    succeeds. The failed changes are dropped from the queue; the caller
+    still has them in memory and can queue a snapshot.
+    """
+
+    def __init__(self, delay_ms: int = SAVE_COALESCE_MS):
+        self.delay = delay_ms / 1000
+        # Error of the last write, None once a write succeeds
+        self.error: Optional[Exception] = None
+
+        self._condition = threading.Condition()
+        self._changes: List[Tuple[str, Dict, Optional[Dict]]] = []
+        self._snapshot: Optional[TransactionStore] = None
+        self._writing = False
+        self._flushing = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="saver", daemon=True)
+        self._thread.start()
+
+    def save_change(self, operation: str, transaction: Dict, previous: Optional[Dict] = None):
+        """Queue one change; the dicts must not be modified afterwards"""
+        with self._condition:
+            self._changes.append((operation, transaction, previous))
+            self._condition.notify_all()
+
+    def save_snapshot(self, transactions: TransactionStore):
+        """Queue a full snapshot of a store that is no longer modified (see ``TransactionStore.copy``)"""
+        with self._condition:
+            self._snapshot = transactions
+            self._changes = []
+            self._condition.notify_all()
+
+    @property
+    def pending(self) -> bool:
+        """True while queued changes are not written yet"""
+        with self._condition:
+            return self._has_work() or self._writing
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything queued now and wait for it.
+        Returns False if saving failed (see ``error``) or did not finish in time.
+        """
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                done = self._condition.wait_for(lambda: not (self._has_work() or self._writing), timeout)
+            finally:
+                self._flushing -= 1
+            return done and self.error is None
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Flush, then stop the worker"""
+        saved = self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        return saved
+
+    def _has_work(self) -> bool:
+        return bool(self._changes) or self._snapshot is not None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._has_work() or self._closed)
+                if not self._has_work():
+                    return
+
+                # Give a burst of edits time to arrive, unless someone is waiting
+                deadline = time.monotonic() + self.delay
+                while not (self._flushing or self._closed):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                snapshot, changes = self._snapshot, self._changes
+                self._snapshot, self._changes = None, []
+                self._writing = True
+
+            error = None
+            try:
+                if snapshot is not None:
+                    write_transactions(snapshot)
+                if changes:
+                    write_changes(changes)
+            except Exception as e:
+                error = e
+
+            with self._condition:
+                self.error = error
+                self._writing = False
+                self._condition.notify_all()
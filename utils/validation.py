@@ -1,4 +1,5 @@
 from pathlib import Path
+from utils.money import parse_amount
 
 def validate_path(path: str, should_exist: bool = True) -> bool:
     """Validate the path"""
@@ -14,15 +15,15 @@ def validate_icon_path(icon_path: str) -> bool:
     """Check if icon exists"""
     return validate_path(icon_path, should_exist=True)
 
-def validate_amount(amount_str: str) -> tuple[bool, float]:
-    """Validate the amount"""
+def validate_amount(amount_str: str) -> tuple[bool, int]:
+    """Validate the amount and return it in minor units (halalas)"""
     try:
-        amount = float(amount_str)
+        amount = parse_amount(amount_str)
         if amount <= 0:
-            return False, 0.0
+            return False, 0
         return True, amount
-    except ValueError:
-        return False, 0.0
+    except (ValueError, ArithmeticError):
+        return False, 0
 
 def validate_passcode(passcode: str) -> bool:
     """Validate the passcode"""